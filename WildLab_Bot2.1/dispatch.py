@@ -0,0 +1,139 @@
+# dispatch.py
+import asyncio
+import signal
+from collections import deque
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+POLLING_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+
+class UpdateDispatcher:
+    """
+    Слой раздачи обновлений в Dispatcher.
+
+    Обновления разных чатов обрабатываются параллельно (не больше concurrency
+    одновременно), а обновления одного чата — строго по очереди, чтобы
+    переходы FSM не перемешивались. Если необработанных обновлений набралось
+    max_pending, submit ждёт освобождения места — так поллинг перестаёт
+    забирать новые обновления, а webhook задерживает ответ Telegram.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, concurrency: int, max_pending: int):
+        self.bot = bot
+        self.dp = dp
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._queues: dict[int | str, deque[Update]] = {}
+        self._runners: dict[int | str, asyncio.Task] = {}
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @staticmethod
+    def chat_key(update: Update) -> int | str:
+        """Ключ очереди: чат, иначе пользователь, иначе само обновление"""
+        context = UserContextMiddleware.resolve_event_context(update)
+        if context.chat:
+            return context.chat.id
+        if context.user:
+            return context.user.id
+        # Обновления без чата и пользователя ни с чем не упорядочиваем
+        return f"update:{update.update_id}"
+
+    async def submit(self, update: Update):
+        await self._slots.acquire()
+        key = self.chat_key(update)
+
+        self._pending += 1
+        self._idle.clear()
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._runners[key] = asyncio.create_task(self._run_chat(key, queue))
+        queue.append(update)
+
+    async def _run_chat(self, key: int | str, queue: deque[Update]):
+        try:
+            while queue:
+                update = queue.popleft()
+                try:
+                    async with self._semaphore:
+                        await self.dp.feed_update(self.bot, update)
+                except Exception as e:
+                    logger.error(f"Error processing update {update.update_id}: {e}")
+                finally:
+                    self._pending -= 1
+                    self._slots.release()
+        finally:
+            # Очередь пуста: следующий submit для этого чата запустит новую задачу
+            del self._queues[key]
+            del self._runners[key]
+            if not self._pending:
+                self._idle.set()
+
+    async def close(self, timeout: float):
+        """Дорабатывает принятые обновления, остальное отменяет по таймауту"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Update drain timed out with {self._pending} updates left")
+
+        tasks = list(self._runners.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def poll(self, polling_timeout: int = 30):
+        """Long polling: обновления забираются, пока есть место в очередях"""
+        backoff = Backoff(config=POLLING_BACKOFF)
+        get_updates = GetUpdates(timeout=polling_timeout,
+                                 allowed_updates=self.dp.resolve_used_update_types())
+        request_timeout = int(self.bot.session.timeout + polling_timeout)
+
+        while True:
+            try:
+                updates = await self.bot(get_updates, request_timeout=request_timeout)
+            except Exception as e:
+                logger.error(f"Failed to fetch updates: {e}")
+                await backoff.asleep()
+                continue
+            backoff.reset()
+
+            for update in updates:
+                await self.submit(update)
+                get_updates.offset = update.update_id + 1
+
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    updates = UpdateDispatcher(bot, dp, concurrency=Config.UPDATE_CONCURRENCY,
+                               max_pending=Config.UPDATE_MAX_PENDING)
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    logger.info(f"Polling started with concurrency {Config.UPDATE_CONCURRENCY}")
+
+    poller = asyncio.create_task(updates.poll())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, poller.cancel)
+
+    try:
+        await poller
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await updates.close(Config.UPDATE_DRAIN_TIMEOUT)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()
+        logger.info("Polling stopped")
@@ -1,16 +1,15 @@
 # handlers/auto_reply_five_stars.py
 from aiogram import Router, types, F
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 from models import Session, UserSettings
-from keyboards import back_button
+from services.settings_cache import settings_cache
+from keyboards import back_button, five_stars_toggle_menu
 
 router = Router()
 
 
 @router.callback_query(F.data == "auto_reply_five_stars")
 async def auto_reply_five_stars_handler(callback: types.CallbackQuery):
-    with Session() as session:
-        user = session.get(UserSettings, callback.from_user.id)
+    user = await settings_cache.get(callback.from_user.id)
 
     status = "✅ Включено" if user.auto_reply_five_stars else "❌ Выключено"
 
@@ -21,30 +20,23 @@ async def auto_reply_five_stars_handler(callback: types.CallbackQuery):
         "Выберите действие:"
     )
 
-    builder = InlineKeyboardBuilder()
-    builder.button(
-        text=f"{'❌ Выключить' if user.auto_reply_five_stars else '✅ Включить'} автоответ",
-        callback_data="toggle_five_stars"
-    )
-    builder.button(text="◀️ Назад", callback_data="auto_reply_settings")
-    builder.adjust(1)
-
     await callback.message.edit_text(
         text,
-        reply_markup=builder.as_markup(),
+        reply_markup=five_stars_toggle_menu(user),
         parse_mode="Markdown"
     )
 
 
 @router.callback_query(F.data == "toggle_five_stars")
 async def toggle_five_stars_handler(callback: types.CallbackQuery):
-    with Session() as session:
-        user = session.get(UserSettings, callback.from_user.id)
+    async with Session() as session:
+        user = await session.get(UserSettings, callback.from_user.id)
         if not user:
             user = UserSettings(user_id=callback.from_user.id)
             session.add(user)
 
         user.auto_reply_five_stars = not user.auto_reply_five_stars
-        session.commit()
+        await session.commit()
+        settings_cache.update(user)
 
     await auto_reply_five_stars_handler(callback)
\ No newline at end of file
@@ -2,90 +2,130 @@
 from aiogram import Router, types, F
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from models import Session, UserSettings
+from sqlalchemy import select
+from models import Session, UserSettings, ReviewWatermark, ReviewSync
+from services.settings_cache import settings_cache
 from states import ReviewState
 from keyboards import back_button, back_button_auto,  back_button_auto2
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from utils.pagination import paginate_reviews
 from utils.prompts import build_prompt
+import asyncio
+import json
 import logging
+import random
 import time
-from typing import Union
-from utils.wb_api import WildberriesAPI
+from functools import partial
+from typing import Awaitable, Callable, Union
+from utils.wb_api import WildberriesAPI, feedback_timestamp
+from services.review_store import review_store
+from services.auto_reply import AutoReplyPipeline
+from services.generation import generation_service, GenerationCancelled
+from services.reply_cache import generate_cached
+from services.outbox import reply_outbox
+from services.notifier import notifier
+from config import Config
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 
-# ============ Заглушки для интеграций ============
+# ============ Автоответы ============
 
-async def get_unanswered_reviews(user_id: int) -> list:
-    with Session() as session:
-        user = session.get(UserSettings, user_id)
-        if not user or not user.wb_api_key:
-            logger.warning(f"User {user_id} has no WB API key configured")
-            return []
+auto_reply_pipeline = AutoReplyPipeline(
+    generate=generate_cached,
+    concurrency=Config.AUTO_REPLY_CONCURRENCY
+)
 
-        wb_api = WildberriesAPI(user.wb_api_key)
-        try:
-            reviews = await wb_api.get_unanswered_reviews()
+# ============ Периодическая проверка отзывов ============
 
-            # Логируем ответ от API
-            logger.debug(f"API Response: {reviews}")
+async def check_new_reviews(bot, owns: Callable[[int], bool] | None = None):
+    async with Session() as session:
+        result = await session.execute(select(UserSettings).where(UserSettings.wb_api_key.isnot(None)))
+        users = result.scalars().all()
+        result = await session.execute(select(ReviewWatermark))
+        watermarks = {watermark.user_id: watermark for watermark in result.scalars()}
+        result = await session.execute(select(ReviewSync))
+        synced = {sync.user_id: sync.synced_at for sync in result.scalars()}
+
+    # В режиме шардирования проверяем только продавцов своих шардов
+    if owns is not None:
+        users = [user for user in users if owns(user.user_id)]
+
+    # Проверяем продавцов параллельно, но не больше POLL_CONCURRENCY одновременно
+    semaphore = asyncio.Semaphore(Config.POLL_CONCURRENCY)
+    await asyncio.gather(*(
+        check_user_reviews(user, watermarks.get(user.user_id), synced.get(user.user_id), semaphore)
+        for user in users
+    ))
+
+
+async def check_user_reviews(user: UserSettings, watermark: ReviewWatermark | None, synced_at: float | None,
+                             semaphore: asyncio.Semaphore):
+    # Случайная задержка разносит запросы разных ключей по интервалу проверки
+    await asyncio.sleep(random.uniform(0, Config.POLL_JITTER))
+
+    async with semaphore:
+        try:
+            wb_api = WildberriesAPI(user.wb_api_key)
 
-            if not isinstance(reviews, list):
-                logger.error(f"Invalid reviews format: {type(reviews)}")
-                return []
+            # Периодически сверяем локальное хранилище с WB целиком
+            unanswered = None
+            if synced_at is None or synced_at < time.time() - Config.REVIEW_STORE_RESYNC:
+                unanswered = await wb_api.get_unanswered_reviews()
+                await review_store.sync(user.user_id, unanswered)
 
-            return reviews
-        except Exception as e:
-            logger.error(f"WB API error: {e}")
-            return []
+            if watermark is None and unanswered is not None:
+                # Без водяного знака дельта — все неотвеченные, они только что выгружены
+                reviews = unanswered
+            else:
+                # Забираем только отзывы новее водяного знака
+                reviews = await wb_api.get_new_reviews(
+                    since=watermark.last_feedback_at if watermark else None,
+                    seen_ids=set(json.loads(watermark.last_feedback_ids or "[]")) if watermark else None
+                )
+                await review_store.upsert(user.user_id, reviews)
+            if not reviews:
+                return
 
+            report = await auto_reply_pipeline.run(user, reviews)
 
-def generate_reply(prompt: str) -> str:
-    return f"Спасибо за ваш отзыв! Мы ценим ваше мнение."
+            # Водяной знак мог остаться на месте, и дельта придёт повторно —
+            # сообщаем только об отзывах, о которых ещё не сообщали
+            fresh = await review_store.take_unnotified(user.user_id, [review["id"] for review in reviews])
 
+            # Одно сводное уведомление за проход вместо сообщения на каждый отзыв
+            lines = []
+            if user.notifications_enabled and fresh:
+                lines.append(f"📨 У вас новые отзывы: {len(fresh)}")
+            if report.sent or fresh.intersection(map(str, report.failed)):
+                lines.append(report.summary())
+            if lines:
+                notifier.notify(user.user_id, "\n".join(lines))
 
-async def send_review_reply(feedback_id: str, text: str, user_id: int) -> bool:
-    with Session() as session:
-        user = session.get(UserSettings, user_id)
-        if not user or not user.wb_api_key:
-            return False
+            if report.failed:
+                # Не сдвигаем водяной знак: отзывы без ответа подхватит следующий проход
+                logger.warning(f"Auto-reply generation failed for user {user.user_id}: {len(report.failed)} reviews")
+                return
+            await save_watermark(user.user_id, reviews)
+        except Exception as e:
+            logger.error(f"Error processing reviews for user {user.user_id}: {e}")
 
-        wb_api = WildberriesAPI(user.wb_api_key)
-        return await wb_api.send_reply(feedback_id, text)
 
-# ============ Периодическая проверка отзывов ============
+async def save_watermark(user_id: int, reviews: list):
+    newest_at = max(feedback_timestamp(review) for review in reviews)
+    ids = {str(review.get("id")) for review in reviews if feedback_timestamp(review) == newest_at}
 
-async def check_new_reviews(bot):
-    with Session() as session:
-        users = session.query(UserSettings).all()
-        for user in users:
-            try:
-                reviews = get_unanswered_reviews(user.user_id)
-                if not reviews:
-                    continue
-
-                if user.notifications_enabled:
-                    await bot.send_message(
-                        user.user_id,
-                        f"📨 У вас новые отзывы: {len(reviews)}"
-                    )
-
-                for review in reviews:
-                    if (user.auto_reply_enabled and user.auto_reply_five_stars and
-                            review["stars"] == 5 and review["cons"] in ("", None, "-")):
-                        prompt = build_prompt(review, user, [])
-                        reply = generate_reply(prompt)
-                        send_review_reply(review["id"], reply)
-                        await bot.send_message(
-                            user.user_id,
-                            f"🤖 Автоответ отправлен для отзыва id {review['id']}"
-                        )
-            except Exception as e:
-                logger.error(f"Error processing reviews for user {user.user_id}: {e}")
+    async with Session() as session:
+        watermark = await session.get(ReviewWatermark, user_id) or ReviewWatermark(user_id=user_id)
+        # Знак остался на той же секунде — дополняем уже виденные отзывы
+        if watermark.last_feedback_at == newest_at:
+            ids |= set(json.loads(watermark.last_feedback_ids or "[]"))
+        watermark.last_feedback_at = newest_at
+        watermark.last_feedback_ids = json.dumps(sorted(ids))
+        session.add(watermark)
+        await session.commit()
 
 
 # ============ Обработка отзывов пользователем ============
@@ -177,25 +217,11 @@ async def back_to_current_review_handler(callback: types.CallbackQuery, state: F
 async def reviews_list_handler(callback: types.CallbackQuery, state: FSMContext):
     try:
         # Получаем пользователя из базы данных
-        with Session() as session:
-            user = session.get(UserSettings, callback.from_user.id)
-            if not user or not user.wb_api_key:
-                await callback.message.edit_text(
-                    "❌ API-ключ не настроен. Перейдите в настройки, чтобы добавить ключ.",
-                    reply_markup=back_button()
-                )
-                return
-
-        # Получаем отзывы через API Wildberries
-        all_reviews = await get_unanswered_reviews(callback.from_user.id)
+        user = await settings_cache.get(callback.from_user.id)
 
-        # Логируем полученные отзывы
-        logger.debug(f"All reviews: {all_reviews}")
-
-        # Если отзывов нет
-        if not all_reviews:
+        if not user or not user.wb_api_key:
             await callback.message.edit_text(
-                "ℹ️ Нет новых отзывов с комментариями.",
+                "❌ API-ключ не настроен. Перейдите в настройки, чтобы добавить ключ.",
                 reply_markup=back_button()
             )
             return
@@ -212,59 +238,37 @@ async def reviews_list_handler(callback: types.CallbackQuery, state: FSMContext)
             current_page = 0
             await state.update_data(page=current_page)
 
-        # Пагинация отзывов
-        paginated = paginate_reviews(all_reviews, current_page)
+        # Отзывы читаются из локального хранилища, которое ведёт поллер
+        await review_store.ensure_synced(callback.from_user.id)
+        paginated = await paginate_reviews(
+            partial(review_store.get_page, callback.from_user.id),
+            current_page,
+            Config.REVIEWS_PAGE_SIZE,
+            back_callback="auto_reply",
+            actions=[InlineKeyboardButton(text="⭐ Ответить на все 5★", callback_data="bulk_five_stars")]
+        )
 
         # Логируем результат пагинации
         logger.debug(f"Paginated result: {paginated}")
 
-        # Формируем текст сообщения
-        text = "📢 **Новые отзывы**\n\nВыберите отзыв для ответа:"
-
-        # Создаем клавиатуру для отзывов
-        builder = InlineKeyboardBuilder()
-        for review in paginated["reviews"]:
-            # Проверяем, что review — это словарь и содержит необходимые поля
-            if not isinstance(review, dict):
-                logger.warning(f"Invalid review format: {review}")
-                continue
-
-            review_id = review.get("id")
-            stars = review.get("stars", 0)
-            comment = review.get("comment", "")
-            has_photo = review.get("photo", False)
-
-            # Формируем текст кнопки
-            review_text = f"{stars}⭐ | {'📸' if has_photo else ''} {comment[:20]}..."
-            builder.button(
-                text=review_text,
-                callback_data=f"review_{review_id}"
+        # Если отзывов нет
+        if not paginated["reviews"]:
+            await callback.message.edit_text(
+                "ℹ️ Нет новых отзывов с комментариями.",
+                reply_markup=back_button()
             )
+            return
 
-        # Добавляем кнопки пагинации
-        if paginated["keyboard"]:
-            for row in paginated["keyboard"].inline_keyboard:
-                for button in row:
-                    builder.button(
-                        text=button.text,
-                        callback_data=button.callback_data
-                    )
-
-        # Добавляем кнопку "Назад"
-        builder.button(text="◀️ Назад", callback_data="auto_reply")
-
-        # Настраиваем разметку
-        if paginated["keyboard"]:
-            pagination_buttons_per_row = len(paginated["keyboard"].inline_keyboard[0])
-        else:
-            pagination_buttons_per_row = 1
+        if paginated["page"] != current_page:
+            await state.update_data(page=paginated["page"])
 
-        builder.adjust(1, pagination_buttons_per_row)
+        # Формируем текст сообщения
+        text = "📢 **Новые отзывы**\n\nВыберите отзыв для ответа:"
 
         # Отправляем сообщение с отзывами
         await callback.message.edit_text(
             text,
-            reply_markup=builder.as_markup(),
+            reply_markup=paginated["keyboard"],
             parse_mode="Markdown"
         )
 
@@ -281,8 +285,7 @@ async def review_detail_handler(callback: types.CallbackQuery, state: FSMContext
 
         review_id = int(callback.data.split("_")[1])
         user_id = callback.from_user.id
-        reviews = get_unanswered_reviews(user_id)
-        review = next((r for r in reviews if r["id"] == review_id), None)
+        review = await review_store.get(user_id, review_id)
         if not review:
             await callback.message.edit_text("❌ Отзыв не найден.")
             return
@@ -356,54 +359,76 @@ async def process_solution(message: types.Message, state: FSMContext):
     await process_generation(message, state)
 
 
+def reply_keyboard():
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🔄 Сгенерировать заново", callback_data="regenerate")
+    builder.button(text="✍️ Ручной ответ", callback_data="write_own")
+    builder.button(text="✅ Отправить", callback_data="send_reply")
+    builder.button(text="◀️ Назад", callback_data="back_to_reviews")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+# Генерация идёт в фоне: хендлер сразу возвращается, и нажатие «Назад»
+# не ждёт в очереди чата, пока модель допишет ответ
+generation_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    generation_tasks.add(task)
+    task.add_done_callback(generation_tasks.discard)
+
+
 async def process_generation(source: Union[types.Message, types.CallbackQuery], state: FSMContext):
+    message = source if isinstance(source, types.Message) else source.message
     try:
         data = await state.get_data()
         is_regenerate = data.get("is_regenerate", False)
 
-        with Session() as session:
-            user_id = source.from_user.id
-            user = session.get(UserSettings, user_id)
-            reviews = get_unanswered_reviews(user_id)
-            review = next((r for r in reviews if r["id"] == data["review_id"]), None)
-
-            # Генерация промпта
-            prompt = build_prompt(
-                review=review,
-                user=user,
-                arguments=data.get("arguments", []),
-                solution=data.get("solution")
-            )
+        user_id = source.from_user.id
+        user = await settings_cache.get(user_id)
+        review = await review_store.get(user_id, data["review_id"])
 
-            # Добавляем перефразирование только при регенерации
-            if is_regenerate:
-                prompt += "\n\nПопробуй написать другими словами:"
-                await state.update_data(is_regenerate=False)
+        # Генерация промпта
+        prompt = build_prompt(
+            review=review,
+            user=user,
+            arguments=data.get("arguments", []),
+            solution=data.get("solution")
+        )
 
-            generated_reply = generate_reply(prompt)
-            await state.update_data(generated_reply=generated_reply)
+        # Добавляем перефразирование только при регенерации
+        if is_regenerate:
+            prompt += "\n\nПопробуй написать другими словами:"
+            await state.update_data(is_regenerate=False)
+            # Регенерация должна дать новый ответ, поэтому кэш не используем
+            generate = partial(generation_service.generate, prompt, key=user_id)
+        else:
+            generate = partial(generate_cached, prompt, namespace=user_id, key=user_id)
+    except Exception as e:
+        logger.error(f"Error in process_generation: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте ещё раз.")
+        return
 
-            builder = InlineKeyboardBuilder()
-            builder.button(text="🔄 Сгенерировать заново", callback_data="regenerate")
-            builder.button(text="✍️ Ручной ответ", callback_data="write_own")
-            builder.button(text="✅ Отправить", callback_data="send_reply")
-            builder.button(text="◀️ Назад", callback_data="back_to_reviews")
-            builder.adjust(1)
+    run_in_background(send_generated_reply(message, state, user_id, prompt, generate))
 
-            if isinstance(source, types.Message):
-                await source.answer(f"📄 **Тестовый промпт**:\n{prompt}")
-                await source.answer(f"🤖 Ответ:\n{generated_reply}", reply_markup=builder.as_markup())
-            else:
-                await source.message.answer(f"📄 **Тестовый промпт**:\n{prompt}")
-                await source.message.answer(f"🤖 Ответ:\n{generated_reply}", reply_markup=builder.as_markup())
 
+async def send_generated_reply(message: types.Message, state: FSMContext, user_id: int, prompt: str,
+                               generate: Callable[[], Awaitable[str]]):
+    try:
+        generated_reply = await generate()
+        await state.update_data(generated_reply=generated_reply)
+
+        await message.answer(f"📄 **Тестовый промпт**:\n{prompt}")
+        await message.answer(f"🤖 Ответ:\n{generated_reply}", reply_markup=reply_keyboard())
+
+    except GenerationCancelled:
+        # Пользователь вышел из сценария, ответ больше не нужен
+        logger.debug(f"Generation cancelled for user {user_id}")
     except Exception as e:
         logger.error(f"Error in process_generation: {e}")
-        error_msg = "❌ Произошла ошибка. Попробуйте ещё раз."
-        if isinstance(source, types.Message):
-            await source.answer(error_msg)
-        else:
-            await source.message.answer(error_msg)
+        await message.answer("❌ Произошла ошибка. Попробуйте ещё раз.")
 
 
 @router.callback_query(F.data == "regenerate")
@@ -420,32 +445,33 @@ async def regenerate_reply(callback: types.CallbackQuery, state: FSMContext):
             is_regenerate=True  # Устанавливаем флаг перефразирования
         )
 
-        with Session() as session:
-            user = session.get(UserSettings, callback.from_user.id)
-            reviews = get_unanswered_reviews(callback.from_user.id)
-            review = next((r for r in reviews if r["id"] == data["review_id"]), None)
+        user = await settings_cache.get(callback.from_user.id)
+        review = await review_store.get(callback.from_user.id, data["review_id"])
+
+        # Генерация нового промпта с флагом перефразирования
+        new_prompt = build_prompt(
+            review=review,
+            user=user,
+            arguments=data.get("arguments", []),
+            solution=data.get("solution")
+        ) + "\n\nПопробуй написать другими словами:"
+    except Exception as e:
+        logger.error(f"Error in regenerate_reply: {e}")
+        await callback.answer("❌ Произошла ошибка. Попробуйте ещё раз.", show_alert=True)
+        return
 
-            # Генерация нового промпта с флагом перефразирования
-            new_prompt = build_prompt(
-                review=review,
-                user=user,
-                arguments=data.get("arguments", []),
-                solution=data.get("solution")
-            ) + "\n\nПопробуй написать другими словами:"
+    run_in_background(edit_regenerated_reply(callback, state, new_prompt))
 
-            new_reply = generate_reply(new_prompt)
-            await state.update_data(generated_reply=new_reply)
 
-            builder = InlineKeyboardBuilder()
-            builder.button(text="🔄 Сгенерировать заново", callback_data="regenerate")
-            builder.button(text="✍️ Ручной ответ", callback_data="write_own")
-            builder.button(text="✅ Отправить", callback_data="send_reply")
-            builder.button(text="◀️ Назад", callback_data="back_to_reviews")
-            builder.adjust(1)
+async def edit_regenerated_reply(callback: types.CallbackQuery, state: FSMContext, prompt: str):
+    try:
+        new_reply = await generation_service.generate(prompt, key=callback.from_user.id)
+        await state.update_data(generated_reply=new_reply)
 
-            await callback.message.edit_text(f"🤖 Новый ответ:\n{new_reply}")
-            await callback.message.edit_reply_markup(reply_markup=builder.as_markup())
+        await callback.message.edit_text(f"🤖 Новый ответ:\n{new_reply}", reply_markup=reply_keyboard())
 
+    except GenerationCancelled:
+        logger.debug(f"Regeneration cancelled for user {callback.from_user.id}")
     except TelegramBadRequest as e:
         if "message is not modified" in str(e):
             await callback.answer("Обновите аргументы для новой генерации")
@@ -460,20 +486,92 @@ async def regenerate_reply(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "send_reply")
 async def send_reply_handler(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    success = await send_review_reply(
-        feedback_id=data["review_id"],
-        text=data["generated_reply"],
-        user_id=callback.from_user.id
-    )
-
-    if success:
-        await callback.answer("✅ Ответ успешно отправлен")
-    else:
+    try:
+        # Отправкой в WB займётся outbox, здесь только ставим ответ в очередь
+        queued = await reply_outbox.enqueue(
+            user_id=callback.from_user.id,
+            feedback_id=data["review_id"],
+            text=data["generated_reply"]
+        )
+    except Exception as e:
+        logger.error(f"Error in send_reply_handler: {e}")
         await callback.answer("❌ Ошибка отправки")
+        return
+
+    if queued:
+        await review_store.mark_answered(callback.from_user.id, [data["review_id"]])
+        await callback.answer("✅ Ответ поставлен в очередь на отправку")
+    else:
+        await callback.answer("ℹ️ Ответ на этот отзыв уже отправляется")
+
+
+@router.callback_query(F.data == "bulk_five_stars")
+async def bulk_five_stars_handler(callback: types.CallbackQuery):
+    try:
+        user = await settings_cache.get(callback.from_user.id)
+        if not user or not user.wb_api_key:
+            await callback.message.edit_text(
+                "❌ API-ключ не настроен. Перейдите в настройки, чтобы добавить ключ.",
+                reply_markup=back_button()
+            )
+            return
+
+        await review_store.ensure_synced(callback.from_user.id)
+        candidates = await review_store.five_star_candidates(callback.from_user.id)
+        if not candidates:
+            await callback.message.edit_text(
+                "ℹ️ Нет отзывов на 5★ без недостатков.",
+                reply_markup=back_button_auto()
+            )
+            return
+
+        builder = InlineKeyboardBuilder()
+        builder.button(text=f"✅ Ответить на все ({len(candidates)})", callback_data="bulk_five_stars_confirm")
+        builder.button(text="◀️ Назад", callback_data="pending_reviews")
+        builder.adjust(1)
+
+        await callback.message.edit_text(
+            f"⭐ Отзывов на 5★ без недостатков: {len(candidates)}\n\n"
+            "Сгенерировать и отправить ответы на все?",
+            reply_markup=builder.as_markup()
+        )
+
+    except Exception as e:
+        logger.error(f"Error in bulk_five_stars_handler: {e}")
+        await callback.message.edit_text("❌ Произошла ошибка. Попробуйте ещё раз.")
+
+
+@router.callback_query(F.data == "bulk_five_stars_confirm")
+async def bulk_five_stars_confirm_handler(callback: types.CallbackQuery):
+    try:
+        user_id = callback.from_user.id
+        user = await settings_cache.get(user_id)
+        if not user or not user.wb_api_key:
+            await callback.answer("❌ API-ключ не настроен", show_alert=True)
+            return
+
+        candidates = await review_store.five_star_candidates(user_id)
+        await callback.message.edit_text(f"⏳ Готовлю ответы: {len(candidates)}...")
+
+        # Ответы генерируются пачкой, а отправку в WB массово выполнит outbox
+        replies = await auto_reply_pipeline.generate_replies(user, candidates)
+        # Отвеченными отмечаем только реально поставленные: остальные уже в очереди или ушли
+        queued = await reply_outbox.enqueue_many(user_id, replies)
+        await review_store.mark_answered(user_id, queued)
+
+        text = f"✅ Ответов поставлено в очередь на отправку: {len(queued)}"
+        if len(replies) < len(candidates):
+            text += f"\n❌ Не удалось сгенерировать: {len(candidates) - len(replies)}"
+        await callback.message.edit_text(text, reply_markup=back_button_auto())
+
+    except Exception as e:
+        logger.error(f"Error in bulk_five_stars_confirm_handler: {e}")
+        await callback.message.edit_text("❌ Произошла ошибка. Попробуйте ещё раз.")
 
 
 @router.callback_query(F.data == "back_to_reviews")
 async def back_to_reviews_handler(callback: types.CallbackQuery, state: FSMContext):
+    generation_service.cancel(callback.from_user.id)
     await state.clear()
     await reviews_list_handler(callback, state)
 
@@ -483,17 +581,3 @@ async def handle_pagination(callback: types.CallbackQuery, state: FSMContext):
     page = int(callback.data.split("_")[1])
     await state.update_data(page=page)
     await reviews_list_handler(callback, state)
-
-
-# ============ Запуск фоновой задачи ============
-
-async def on_startup(dp):
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(check_new_reviews, 'interval', minutes=5, args=(dp.bot,))
-    scheduler.start()
-
-
-if __name__ == "__main__":
-    from aiogram import executor
-
-    executor.start_polling(dp, on_startup=on_startup)
\ No newline at end of file
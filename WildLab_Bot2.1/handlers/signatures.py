@@ -1,17 +1,16 @@
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 from models import Session, UserSettings
+from services.settings_cache import settings_cache
 from states import AutoReplyState
-from keyboards import back_button
+from keyboards import back_button, signatures_menu
 
 router = Router()
 
 
 @router.callback_query(F.data == "signatures")
 async def signatures_handler(callback: types.CallbackQuery):
-    with Session() as session:
-        user = session.get(UserSettings, callback.from_user.id)
+    user = await settings_cache.get(callback.from_user.id)
 
     text = (
         "✍️ **Фирменные подписи**\n\n"
@@ -20,26 +19,10 @@ async def signatures_handler(callback: types.CallbackQuery):
         "Выберите действие:"
     )
 
-    builder = InlineKeyboardBuilder()
-    if user.greeting:
-        builder.button(text="✏ Изменить приветствие", callback_data="add_greeting")
-        builder.button(text="❌ Удалить приветствие", callback_data="delete_greeting")
-    else:
-        builder.button(text="🖋 Добавить приветствие", callback_data="add_greeting")
-
-    if user.farewell:
-        builder.button(text="✏ Изменить прощание", callback_data="add_farewell")
-        builder.button(text="❌ Удалить прощание", callback_data="delete_farewell")
-    else:
-        builder.button(text="🖋 Добавить прощание", callback_data="add_farewell")
-
-    builder.button(text="◀️ Назад", callback_data="auto_reply_settings")
-    builder.adjust(1)
-
     # Отправляем новое сообщение вместо редактирования
     await callback.message.answer(
         text,
-        reply_markup=builder.as_markup(),
+        reply_markup=signatures_menu(user),
         parse_mode="Markdown"
     )
 
@@ -64,11 +47,12 @@ async def add_farewell_handler(callback: types.CallbackQuery, state: FSMContext)
 
 @router.message(AutoReplyState.waiting_greeting)
 async def process_greeting(message: types.Message, state: FSMContext):
-    with Session() as session:
-        user = session.get(UserSettings, message.from_user.id) or UserSettings(user_id=message.from_user.id)
+    async with Session() as session:
+        user = await session.get(UserSettings, message.from_user.id) or UserSettings(user_id=message.from_user.id)
         user.greeting = message.text
         session.add(user)
-        session.commit()
+        await session.commit()
+        settings_cache.update(user)
 
     await state.clear()
     await message.answer("✅ Приветствие успешно сохранено!")
@@ -84,11 +68,12 @@ async def process_greeting(message: types.Message, state: FSMContext):
 
 @router.message(AutoReplyState.waiting_farewell)
 async def process_farewell(message: types.Message, state: FSMContext):
-    with Session() as session:
-        user = session.get(UserSettings, message.from_user.id) or UserSettings(user_id=message.from_user.id)
+    async with Session() as session:
+        user = await session.get(UserSettings, message.from_user.id) or UserSettings(user_id=message.from_user.id)
         user.farewell = message.text
         session.add(user)
-        session.commit()
+        await session.commit()
+        settings_cache.update(user)
 
     await state.clear()
     await message.answer("✅ Прощание успешно сохранено!")
@@ -104,11 +89,12 @@ async def process_farewell(message: types.Message, state: FSMContext):
 
 @router.callback_query(F.data == "delete_greeting")
 async def delete_greeting_handler(callback: types.CallbackQuery):
-    with Session() as session:
-        user = session.get(UserSettings, callback.from_user.id)
+    async with Session() as session:
+        user = await session.get(UserSettings, callback.from_user.id)
         if user:
             user.greeting = None
-            session.commit()
+            await session.commit()
+            settings_cache.update(user)
 
     await callback.answer("Приветствие удалено", show_alert=True)
     # Отправляем новое сообщение вместо редактирования
@@ -117,11 +103,12 @@ async def delete_greeting_handler(callback: types.CallbackQuery):
 
 @router.callback_query(F.data == "delete_farewell")
 async def delete_farewell_handler(callback: types.CallbackQuery):
-    with Session() as session:
-        user = session.get(UserSettings, callback.from_user.id)
+    async with Session() as session:
+        user = await session.get(UserSettings, callback.from_user.id)
         if user:
             user.farewell = None
-            session.commit()
+            await session.commit()
+            settings_cache.update(user)
 
     await callback.answer("Прощание удалено", show_alert=True)
     # Отправляем новое сообщение вместо редактирования
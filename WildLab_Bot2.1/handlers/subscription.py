@@ -1,5 +1,5 @@
 from aiogram import Router, types, Bot
-from services.subscription import check_subscription
+from services.subscription import check_subscription, set_subscription_status, is_channel, SUBSCRIBED_STATUSES
 from keyboards import tables_menu, subscription_menu
 import logging
 
@@ -14,7 +14,8 @@ async def check_subscription_handler(callback: types.CallbackQuery, bot: Bot):
     except Exception as e:
         logger.warning(f"Delete error: {e}")
 
-    if await check_subscription(bot, callback.from_user.id):
+    # Пользователь только что подписался — кэш может быть устаревшим
+    if await check_subscription(bot, callback.from_user.id, force=True):
         await callback.message.answer(
             "📊 Выберите таблицу:",
             reply_markup=tables_menu(),
@@ -25,4 +26,14 @@ async def check_subscription_handler(callback: types.CallbackQuery, bot: Bot):
             "⛔️ Подпишитесь для доступа:",
             reply_markup=subscription_menu(),
             parse_mode="Markdown"
-        )
\ No newline at end of file
+        )
+
+
+@router.chat_member()
+async def channel_member_updated(event: types.ChatMemberUpdated):
+    # Обновления приходят, только если бот — администратор канала
+    if is_channel(event.chat):
+        set_subscription_status(
+            event.new_chat_member.user.id,
+            event.new_chat_member.status in SUBSCRIBED_STATUSES
+        )
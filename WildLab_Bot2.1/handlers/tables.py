@@ -1,9 +1,11 @@
 from aiogram import Router, Bot, types
 from aiogram.utils.keyboard import InlineKeyboardButton, InlineKeyboardBuilder
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import FSInputFile
 from config import Config
 from keyboards import tables_menu, subscription_menu
 from services.subscription import check_subscription
+from services.file_cache import file_cache
 import logging
 
 router = Router()
@@ -28,14 +30,25 @@ async def send_table(
 ):
     try:
         await callback.message.delete()
-        photo = FSInputFile(photo_path)
+        photo = await file_cache.get(photo_path)
+        reply_markup = create_table_keyboard(url).as_markup()
 
-        await callback.message.answer_photo(
-            photo=photo,
-            caption=caption,
-            reply_markup=create_table_keyboard(url).as_markup(),
-            parse_mode="Markdown"
-        )
+        try:
+            message = await callback.message.answer_photo(
+                photo=photo, caption=caption, reply_markup=reply_markup, parse_mode="Markdown"
+            )
+        except TelegramBadRequest:
+            if isinstance(photo, FSInputFile):
+                raise
+            # Сохранённый file_id больше не действителен — загружаем файл заново
+            await file_cache.invalidate(photo_path)
+            photo = FSInputFile(photo_path)
+            message = await callback.message.answer_photo(
+                photo=photo, caption=caption, reply_markup=reply_markup, parse_mode="Markdown"
+            )
+
+        if isinstance(photo, FSInputFile) and message.photo:
+            await file_cache.remember(photo_path, message.photo[-1].file_id)
     except Exception as e:
         logger.error(f"Error sending table: {e}")
         await callback.message.answer("⚠️ Произошла ошибка при загрузке таблицы")
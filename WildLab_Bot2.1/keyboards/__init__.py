@@ -1,8 +1,14 @@
 # keyboards/__init__.py
+from functools import cache
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from aiogram import Bot
 
+# Клавиатуры не меняются между вызовами, поэтому собираются один раз:
+# статичные — при импорте, зависящие от настроек — по набору флагов.
+
+
+@cache
 def main_menu() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="Заказать консультацию🧠", callback_data="consult")
@@ -12,6 +18,7 @@ def main_menu() -> InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
+@cache
 def tables_menu() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="Расчет себестоимости из Китая🇨🇳", callback_data="china_cost")
@@ -20,6 +27,7 @@ def tables_menu() -> InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
+@cache
 def subscription_menu() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="Подписаться", url="https://t.me/imwildlab")
@@ -28,22 +36,38 @@ def subscription_menu() -> InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
+@cache
 def back_to_menu() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="Главное меню🏠", callback_data="start")
     builder.adjust(1)
     return builder.as_markup()
 
+@cache
 def back_button() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="◀️ Назад", callback_data="signatures")
     return builder.as_markup()
 
+@cache
+def auto_reply_menu() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="⚙️ Настройки автоответов", callback_data="auto_reply_settings")
+    builder.button(text="📋 Необработанные отзывы", callback_data="pending_reviews")
+    builder.button(text="◀️ На главную", callback_data="start")
+    builder.adjust(1)
+    return builder.as_markup()
+
 
 def settings_menu(user) -> InlineKeyboardMarkup:
+    return _settings_menu(bool(user and user.wb_api_key))
+
+
+@cache
+def _settings_menu(has_api_key: bool) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
-    if user and user.wb_api_key:
+    if has_api_key:
         builder.button(text="❌ Удалить API-ключ", callback_data="delete_api_key")
     else:
         builder.button(text="🔑 Установить API-ключ", callback_data="set_api_key")
@@ -61,11 +85,16 @@ def review_list_keyboard(reviews: list) -> InlineKeyboardMarkup:
         )
 
 def auto_reply_settings_menu(user) -> InlineKeyboardMarkup:
+    return _auto_reply_settings_menu(bool(user.notifications_enabled))
+
+
+@cache
+def _auto_reply_settings_menu(notifications_enabled: bool) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
 
     builder.button(
-        text=f"🔔 {'Выключить' if user.notifications_enabled else 'Включить'} уведомления",
+        text=f"🔔 {'Выключить' if notifications_enabled else 'Включить'} уведомления",
         callback_data="toggle_notifications"
     )
 
@@ -78,11 +107,16 @@ def auto_reply_settings_menu(user) -> InlineKeyboardMarkup:
 
 
 def auto_reply_five_stars_menu(user) -> InlineKeyboardMarkup:
+    return _auto_reply_five_stars_menu(bool(user.notifications_enabled))
+
+
+@cache
+def _auto_reply_five_stars_menu(notifications_enabled: bool) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
 
     builder.button(
-        text=f"⭐ {'Выключить' if user.notifications_enabled else 'Включить'} автоответы",
+        text=f"⭐ {'Выключить' if notifications_enabled else 'Включить'} автоответы",
         callback_data="toggle_notifications"
     )
 
@@ -91,15 +125,63 @@ def auto_reply_five_stars_menu(user) -> InlineKeyboardMarkup:
 
     return builder.as_markup()
 
+
+def five_stars_toggle_menu(user) -> InlineKeyboardMarkup:
+    return _five_stars_toggle_menu(bool(user.auto_reply_five_stars))
+
+
+@cache
+def _five_stars_toggle_menu(enabled: bool) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text=f"{'❌ Выключить' if enabled else '✅ Включить'} автоответ",
+        callback_data="toggle_five_stars"
+    )
+    builder.button(text="◀️ Назад", callback_data="auto_reply_settings")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def signatures_menu(user) -> InlineKeyboardMarkup:
+    return _signatures_menu(bool(user.greeting), bool(user.farewell))
+
+
+@cache
+def _signatures_menu(has_greeting: bool, has_farewell: bool) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    if has_greeting:
+        builder.button(text="✏ Изменить приветствие", callback_data="add_greeting")
+        builder.button(text="❌ Удалить приветствие", callback_data="delete_greeting")
+    else:
+        builder.button(text="🖋 Добавить приветствие", callback_data="add_greeting")
+
+    if has_farewell:
+        builder.button(text="✏ Изменить прощание", callback_data="add_farewell")
+        builder.button(text="❌ Удалить прощание", callback_data="delete_farewell")
+    else:
+        builder.button(text="🖋 Добавить прощание", callback_data="add_farewell")
+
+    builder.button(text="◀️ Назад", callback_data="auto_reply_settings")
+    builder.adjust(1)
+    return builder.as_markup()
+
+@cache
 def back_button_auto() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="◀️ Назад", callback_data="pending_reviews")
 
     return builder.as_markup()
 
+@cache
 def back_button_auto2() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="Настройки⚙️", callback_data="settings")
     builder.button(text="◀️ Назад", callback_data="auto_reply")
     builder.adjust(1)
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+
+# Собираем статичные клавиатуры заранее, чтобы первый клик не платил за построение
+for _keyboard in (main_menu, tables_menu, subscription_menu, back_to_menu, back_button,
+                  auto_reply_menu, back_button_auto, back_button_auto2):
+    _keyboard()
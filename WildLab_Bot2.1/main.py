@@ -1,8 +1,21 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from config import Config
+from models import init_db, close_db
+from storage import build_fsm_storage
+from webhook import run_webhook
+from dispatch import run_polling
 from utils import pagination, prompts
+from utils.http_client import http_client
+from utils.telegram_throttle import TelegramThrottle
+from utils.wb_api import share_wb_quota
+from services.scheduler import AdaptiveScheduler
+from services.generation import generation_service
+from services.outbox import reply_outbox
+from services.notifier import notifier
 from handlers import (
     start,
     consultation,
@@ -11,19 +24,33 @@ from handlers import (
     signatures,
     reviews,
     auto_reply,
-    auto_reply_five_stars
+    auto_reply_five_stars,
+    subscription
 )
 
-async def main():
-    # Настройка логов
-    logging.basicConfig(
-        level=logging.INFO,
-        format=Config.LOG_FORMAT
-    )
+def create_bot(processes: int = 1) -> Bot:
+    # Для нагрузочных тестов API Telegram можно подменить локальной заглушкой
+    session = None
+    if Config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(Config.TELEGRAM_API_URL))
+    bot = Bot(token=Config.API_TOKEN, session=session)
 
-    # Инициализация бота
-    bot = Bot(token=Config.API_TOKEN)
-    dp = Dispatcher()
+    # Общий и поканальный лимиты Telegram, ожидание retry_after при 429.
+    # Общий лимит бота делится между процессами, которые пишут от его имени
+    bot.session.middleware(TelegramThrottle(
+        global_rate=Config.TELEGRAM_GLOBAL_RATE / processes,
+        global_burst=Config.TELEGRAM_GLOBAL_BURST,
+        chat_rate=Config.TELEGRAM_CHAT_RATE,
+        chat_burst=Config.TELEGRAM_CHAT_BURST,
+        retries=Config.TELEGRAM_RETRY_ATTEMPTS,
+        max_chats=Config.TELEGRAM_CHAT_BUCKETS
+    ))
+    return bot
+
+
+def create_dispatcher(with_poller: bool = True) -> Dispatcher:
+    storage, events_isolation = build_fsm_storage()
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation)
 
     # Регистрация роутеров
     dp.include_router(start.router)
@@ -34,10 +61,57 @@ async def main():
     dp.include_router(signatures.router)
     dp.include_router(reviews.router)
     dp.include_router(auto_reply_five_stars.router)
+    dp.include_router(subscription.router)
+
+    # Очередь генерации ответов
+    dp.startup.register(generation_service.start)
+    dp.shutdown.register(generation_service.stop)
+
+    # Отправка ответов в WB из outbox
+    dp.startup.register(reply_outbox.start)
+    dp.shutdown.register(reply_outbox.stop)
+
+    # Фоновая проверка новых отзывов
+    if with_poller:
+        review_scheduler = AdaptiveScheduler("check_new_reviews", reviews.check_new_reviews)
+        dp.startup.register(review_scheduler.start)
+        dp.shutdown.register(review_scheduler.shutdown)
+
+    # Фоновые уведомления; останавливаются последними, чтобы дослать накопленное
+    dp.startup.register(notifier.start)
+    dp.shutdown.register(notifier.stop)
+
+    # Закрытие общего HTTP-пула и пула соединений с БД при остановке
+    dp.shutdown.register(http_client.close)
+    dp.shutdown.register(close_db)
+    return dp
+
+
+async def main():
+    # Настройка логов
+    logging.basicConfig(
+        level=logging.INFO,
+        format=Config.LOG_FORMAT
+    )
+
+    # Инициализация базы данных
+    await init_db()
+
+    # Инициализация бота
+    # При шардировании отзывы проверяют отдельные процессы poller.py
+    sharded = Config.POLL_SHARDS > 1
+    bot = create_bot(processes=Config.POLL_SHARDS + 1 if sharded else 1)
+    if sharded:
+        # Ключом продавца пользуется и шард поллера — делим квоту WB с ним
+        share_wb_quota(Config.SHARD_WB_KEY_PROCESSES)
+    dp = create_dispatcher(with_poller=not sharded)
 
-    # Запуск поллинга
-    await dp.start_polling(bot)
+    # Запуск webhook-сервера или поллинга
+    if Config.RUN_MODE == "webhook":
+        await run_webhook(bot, dp)
+    else:
+        await run_polling(bot, dp)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
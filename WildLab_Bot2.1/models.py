@@ -1,6 +1,8 @@
 # models.py
-from sqlalchemy import create_engine, Column, Integer, String, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import Column, Integer, String, Boolean, Float, Index, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from config import Config
 
 Base = declarative_base()
 
@@ -17,7 +19,126 @@ class UserSettings(Base):
     farewell = Column(String)
 
 
-# Инициализация базы данных
-engine = create_engine('sqlite:///bot.db')
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+class SchedulerRun(Base):
+    __tablename__ = 'scheduler_runs'
+
+    job_name = Column(String, primary_key=True)
+    last_started_at = Column(Float)
+    last_finished_at = Column(Float)
+    last_duration = Column(Float)
+
+
+class ReviewWatermark(Base):
+    __tablename__ = 'review_watermarks'
+
+    user_id = Column(Integer, primary_key=True)
+    last_feedback_at = Column(Float)
+    # Все отзывы с временем last_feedback_at (JSON-список): в одну секунду их может быть несколько
+    last_feedback_ids = Column(String)
+
+
+class ReplyCacheEntry(Base):
+    __tablename__ = 'reply_cache'
+
+    key = Column(String, primary_key=True)
+    namespace = Column(Integer, index=True)
+    reply = Column(String)
+    created_at = Column(Float)
+
+
+class TelegramFile(Base):
+    __tablename__ = 'telegram_files'
+
+    path = Column(String, primary_key=True)
+    sha256 = Column(String)
+    file_id = Column(String)
+
+
+class OutboxReply(Base):
+    __tablename__ = 'reply_outbox'
+
+    # Ключ идемпотентности: один ответ на отзыв, сколько бы раз ни нажали «Отправить»
+    idempotency_key = Column(String, primary_key=True)
+    user_id = Column(Integer, index=True)
+    feedback_id = Column(String)
+    text = Column(String)
+    status = Column(String, default='pending', index=True)
+    attempts = Column(Integer, default=0)
+    # Для 'sending' — срок аренды: после него зависшую отправку забирает другой воркер
+    next_attempt_at = Column(Float, index=True)
+    last_error = Column(String)
+    created_at = Column(Float)
+    sent_at = Column(Float)
+
+
+class ShardLease(Base):
+    __tablename__ = 'poller_leases'
+
+    shard = Column(Integer, primary_key=True)
+    owner = Column(String)
+    expires_at = Column(Float)
+    # Шард взят чужим процессом после падения владельца
+    adopted = Column(Boolean, default=False)
+
+
+class Review(Base):
+    __tablename__ = 'reviews'
+    __table_args__ = (
+        # Список неотвеченных (новые сверху) и фильтр по звёздам
+        Index('ix_reviews_pending', 'user_id', 'answered', 'created_at'),
+        Index('ix_reviews_stars', 'user_id', 'answered', 'stars'),
+    )
+
+    user_id = Column(Integer, primary_key=True)
+    feedback_id = Column(String, primary_key=True)
+    stars = Column(Integer)
+    cons = Column(String)
+    answered = Column(Boolean, default=False)
+    # Продавцу уже сообщили об этом отзыве: повторный проход поллера не дублирует уведомление
+    notified = Column(Boolean, default=False)
+    created_at = Column(Float)
+    # Когда отзыв последний раз пришёл из WB — по нему находятся отвеченные вне бота
+    seen_at = Column(Float)
+    # Отзыв целиком в JSON, как его вернул WB
+    data = Column(String)
+
+
+class ReviewSync(Base):
+    __tablename__ = 'review_syncs'
+
+    user_id = Column(Integer, primary_key=True)
+    synced_at = Column(Float)
+    # Число неотвеченных: пересчитывается при записи, чтобы список не делал COUNT
+    pending = Column(Integer)
+
+
+# Инициализация базы данных (sqlite+aiosqlite по умолчанию, postgresql+asyncpg — опционально)
+is_sqlite = Config.DATABASE_URL.startswith('sqlite')
+
+engine = create_async_engine(
+    Config.DATABASE_URL,
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
+    pool_pre_ping=not is_sqlite
+)
+
+if is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL позволяет читать параллельно с записью
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={Config.DB_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db():
+    await engine.dispose()
@@ -0,0 +1,97 @@
+# poller.py
+"""
+Проверка новых отзывов в отдельных процессах (шардах).
+
+Все шарды в одном запуске: python poller.py --shards 4
+Один шард (например, на другой машине): python poller.py --shards 4 --shard 2
+Бот при этом запускается с BOT_POLL_SHARDS=4, чтобы не проверять отзывы сам.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from config import Config
+from models import init_db, close_db
+from utils.http_client import http_client
+from utils.wb_api import share_wb_quota
+from services.generation import generation_service
+from services.notifier import notifier
+from services.sharding import ShardedPoller
+from handlers.reviews import check_new_reviews
+from main import create_bot
+
+
+async def prepare_db():
+    await init_db()
+    # Соединения не должны переходить в дочерние процессы
+    await close_db()
+
+
+async def run_shard(shard: int, shards: int):
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+
+    # Лимит Telegram делят шарды и процесс бота
+    bot = create_bot(processes=shards + 1)
+    # Ключом продавца пользуется и процесс бота — делим квоту WB с ним
+    share_wb_quota(Config.SHARD_WB_KEY_PROCESSES)
+    poller = ShardedPoller(shard, shards, check_new_reviews)
+
+    await generation_service.start()
+    await notifier.start(bot)
+    await poller.start(bot)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        await poller.shutdown()
+        await generation_service.stop()
+        await notifier.stop()
+        await http_client.close()
+        await bot.session.close()
+        await close_db()
+
+
+def _shard_process(shard: int, shards: int):
+    asyncio.run(run_shard(shard, shards))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=Config.POLL_SHARDS)
+    parser.add_argument("--shard", type=int, help="запустить только этот шард")
+    args = parser.parse_args()
+
+    # Схему создаём один раз до запуска шардов, иначе они гоняются за CREATE TABLE
+    asyncio.run(prepare_db())
+
+    if args.shard is not None:
+        asyncio.run(run_shard(args.shard, args.shards))
+        return
+
+    processes = [
+        multiprocessing.Process(target=_shard_process, args=(shard, args.shards), name=f"poller-{shard}")
+        for shard in range(args.shards)
+    ]
+    for process in processes:
+        process.start()
+
+    # Сигнал остановки пересылаем шардам и ждём их корректного завершения
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# services/auto_reply.py
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from services.outbox import reply_outbox
+from services.review_store import review_store
+from utils.prompts import build_prompt
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def is_five_star_candidate(review: dict) -> bool:
+    """5 звёзд и не указаны недостатки"""
+    return review.get("stars") == 5 and review.get("cons") in ("", None, "-")
+
+
+@dataclass
+class AutoReplyReport:
+    sent: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+
+    def summary(self) -> str:
+        text = f"🤖 Автоответы поставлены в очередь на отправку: {len(self.sent)}"
+        if self.failed:
+            text += f"\n❌ Не удалось сгенерировать: {len(self.failed)}"
+        return text
+
+
+class AutoReplyPipeline:
+    """
+    Автоответ на отзывы в несколько этапов: отбор → промпт → генерация → отправка.
+
+    Ответы генерируются параллельно (не больше concurrency одновременно) и
+    ставятся в reply_outbox: доставку с повторами и уведомление о неудаче
+    берёт на себя он, так что ответ не теряется при сбое WB.
+    """
+
+    def __init__(self, generate: Callable[[str, int], Awaitable[str]], concurrency: int):
+        self.generate = generate
+        self.concurrency = concurrency
+
+    def select(self, user, reviews: list) -> list:
+        if not (user.auto_reply_enabled and user.auto_reply_five_stars):
+            return []
+        return [review for review in reviews if is_five_star_candidate(review)]
+
+    async def generate_replies(self, user, reviews: list) -> dict:
+        """Генерирует ответы (не больше concurrency одновременно): {review_id: текст}"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def generate(review: dict) -> str | None:
+            async with semaphore:
+                try:
+                    return await self.generate(build_prompt(review, user, []), user.user_id)
+                except Exception as e:
+                    logger.error(f"Auto-reply generation failed for review {review.get('id')}: {e}")
+                    return None
+
+        replies = await asyncio.gather(*(generate(review) for review in reviews))
+        return {review["id"]: reply for review, reply in zip(reviews, replies) if reply}
+
+    async def run(self, user, reviews: list) -> AutoReplyReport:
+        report = AutoReplyReport()
+        candidates = self.select(user, reviews)
+        if not candidates:
+            return report
+
+        # Уже поставленные в очередь (отмечены отвеченными) повторно не генерируем
+        pending = await review_store.unanswered_ids(user.user_id, [review["id"] for review in candidates])
+        candidates = [review for review in candidates if str(review["id"]) in pending]
+        if not candidates:
+            return report
+
+        replies = await self.generate_replies(user, candidates)
+        report.failed.extend(review["id"] for review in candidates if review["id"] not in replies)
+
+        queued = await reply_outbox.enqueue_many(user.user_id, replies)
+        await review_store.mark_answered(user.user_id, queued)
+        report.sent.extend(queued)
+        return report
@@ -0,0 +1,77 @@
+# services/file_cache.py
+import asyncio
+import hashlib
+import os
+from aiogram.types import FSInputFile
+from models import Session, TelegramFile
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileIdCache:
+    """
+    Кэш file_id загруженных в Telegram файлов.
+
+    file_id хранится в БД вместе с хэшем файла: если файл на диске
+    изменился, старый file_id не используется и файл загружается заново.
+    """
+
+    def __init__(self):
+        # path -> (mtime_ns, size, sha256), чтобы не хэшировать файл на каждый клик
+        self._hashes: dict[str, tuple[int, int, str]] = {}
+        # path -> (sha256, file_id)
+        self._file_ids: dict[str, tuple[str, str]] = {}
+
+    async def _hash(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        sha256 = await asyncio.to_thread(_file_sha256, path)
+        self._hashes[path] = (stat.st_mtime_ns, stat.st_size, sha256)
+        return sha256
+
+    async def get(self, path: str) -> str | FSInputFile:
+        """Возвращает file_id, если файл уже загружен, иначе FSInputFile для загрузки"""
+        sha256 = await self._hash(path)
+
+        cached = self._file_ids.get(path)
+        if cached is None:
+            async with Session() as session:
+                row = await session.get(TelegramFile, path)
+            if row is not None:
+                cached = self._file_ids[path] = (row.sha256, row.file_id)
+
+        if cached and cached[0] == sha256:
+            return cached[1]
+        return FSInputFile(path)
+
+    async def remember(self, path: str, file_id: str):
+        sha256 = await self._hash(path)
+        self._file_ids[path] = (sha256, file_id)
+
+        async with Session() as session:
+            await session.merge(TelegramFile(path=path, sha256=sha256, file_id=file_id))
+            await session.commit()
+        logger.info(f"Cached Telegram file_id for {path}")
+
+    async def invalidate(self, path: str):
+        self._file_ids.pop(path, None)
+        async with Session() as session:
+            row = await session.get(TelegramFile, path)
+            if row is not None:
+                await session.delete(row)
+                await session.commit()
+
+
+file_cache = FileIdCache()
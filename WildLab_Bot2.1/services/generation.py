@@ -0,0 +1,142 @@
+# services/generation.py
+import asyncio
+from abc import ABC, abstractmethod
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCancelled(Exception):
+    """Генерация отменена: пользователь вышел из сценария или запросил новую"""
+
+
+class GenerationBackend(ABC):
+    @abstractmethod
+    async def generate_batch(self, prompts: list[str]) -> list[str]:
+        """Генерирует по одному ответу на каждый промпт, сохраняя порядок"""
+
+
+class StubBackend(GenerationBackend):
+    """Детерминированная локальная заглушка для тестов и разработки"""
+
+    async def generate_batch(self, prompts: list[str]) -> list[str]:
+        return ["Спасибо за ваш отзыв! Мы ценим ваше мнение." for _ in prompts]
+
+
+class GenerationService:
+    """
+    Асинхронная очередь генерации ответов.
+
+    Промпты разных пользователей собираются в пачки (до max_batch штук или
+    batch_window секунд), одновременно выполняется не больше concurrency
+    пачек. Ожидание ограничено timeout, а незавершённую генерацию можно
+    отменить по ключу (обычно user_id).
+    """
+
+    def __init__(self, backend: GenerationBackend, max_batch: int, batch_window: float,
+                 concurrency: int, timeout: float, queue_size: int):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: dict[object, asyncio.Future] = {}
+        self._batches: set[asyncio.Task] = set()
+        self._worker: asyncio.Task | None = None
+
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._collect())
+            logger.info("Generation service started")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for task in list(self._batches):
+            task.cancel()
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        logger.info("Generation service stopped")
+
+    async def generate(self, prompt: str, key=None) -> str:
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            # Новая генерация для того же ключа вытесняет предыдущую
+            self.cancel(key)
+            self._pending[key] = future
+
+        try:
+            await self._queue.put((prompt, future))
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.CancelledError:
+            if future.cancelled() and not asyncio.current_task().cancelling():
+                raise GenerationCancelled()
+            raise
+        finally:
+            if key is not None and self._pending.get(key) is future:
+                del self._pending[key]
+
+    def cancel(self, key):
+        future = self._pending.pop(key, None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Отменённые запросы в модель не отправляем
+            batch = [(prompt, future) for prompt, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            # Ждём свободный слот: при перегрузке очередь копится, а не пачки
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list):
+        try:
+            replies = await asyncio.wait_for(
+                self.backend.generate_batch([prompt for prompt, _ in batch]),
+                self.timeout
+            )
+            for (_, future), reply in zip(batch, replies):
+                if not future.done():
+                    future.set_result(reply)
+        except Exception as e:
+            logger.error(f"Generation batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Пачка отменена при остановке сервиса — отменяем и ожидающих
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            self._semaphore.release()
+
+
+generation_service = GenerationService(
+    backend=StubBackend(),
+    max_batch=Config.GENERATION_MAX_BATCH,
+    batch_window=Config.GENERATION_BATCH_WINDOW,
+    concurrency=Config.GENERATION_CONCURRENCY,
+    timeout=Config.GENERATION_TIMEOUT,
+    queue_size=Config.GENERATION_QUEUE_SIZE
+)
@@ -0,0 +1,80 @@
+# services/notifier.py
+import asyncio
+from aiogram import Bot
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096
+
+
+def _chunks(texts: list[str]) -> list[str]:
+    """Склеивает уведомления в сообщения, не превышающие лимит Telegram"""
+    messages, current = [], ""
+    for text in texts:
+        candidate = f"{current}\n\n{text}" if current else text
+        if len(candidate) <= MESSAGE_LIMIT:
+            current = candidate
+            continue
+        if current:
+            messages.append(current)
+        # Слишком длинное уведомление режем по лимиту
+        while len(text) > MESSAGE_LIMIT:
+            messages.append(text[:MESSAGE_LIMIT])
+            text = text[MESSAGE_LIMIT:]
+        current = text
+    if current:
+        messages.append(current)
+    return messages
+
+
+class Notifier:
+    """
+    Фоновые уведомления пользователям.
+
+    Уведомления в один чат, пришедшие в течение window секунд, объединяются
+    в одно сообщение. Лимиты Telegram соблюдает TelegramThrottle в сессии бота.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._bot: Bot | None = None
+        self._pending: dict[int, list[str]] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+
+    async def stop(self):
+        # Досылаем накопленное, не дожидаясь окна объединения
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(self._flush(chat_id) for chat_id in list(self._pending)))
+
+    def notify(self, chat_id: int, text: str):
+        self._pending.setdefault(chat_id, []).append(text)
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._deliver(chat_id))
+
+    async def _deliver(self, chat_id: int):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            del self._tasks[chat_id]
+        await self._flush(chat_id)
+
+    async def _flush(self, chat_id: int):
+        texts = self._pending.pop(chat_id, None)
+        if not texts:
+            return
+        for message in _chunks(texts):
+            try:
+                await self._bot.send_message(chat_id, message)
+            except Exception as e:
+                logger.error(f"Failed to notify user {chat_id}: {e}")
+
+
+notifier = Notifier(window=Config.NOTIFY_COALESCE_WINDOW)
@@ -0,0 +1,240 @@
+# services/outbox.py
+import asyncio
+import random
+import time
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import Config
+from models import Session, OutboxReply, is_sqlite
+from services.notifier import notifier
+from services.review_store import review_store
+from utils.wb_api import get_user_api
+import logging
+
+logger = logging.getLogger(__name__)
+
+insert = sqlite_insert if is_sqlite else pg_insert
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def idempotency_key(user_id: int, feedback_id) -> str:
+    return f"{user_id}:{feedback_id}"
+
+
+class ReplyOutbox:
+    """
+    Надёжная отправка ответов на отзывы.
+
+    Ответ сначала сохраняется в таблицу reply_outbox, а фоновый воркер
+    доставляет его в WB (ответы одного продавца — массовой отправкой)
+    с экспоненциальной задержкой между попытками.
+    Ограничение частоты на API-ключ соблюдает сам WildberriesAPI.
+    Повторная постановка того же отзыва ничего не меняет, пока ответ
+    ожидает отправки или уже отправлен.
+
+    Перед отправкой воркер захватывает строки условным UPDATE (статус
+    'sending' с арендой на OUTBOX_LEASE секунд), поэтому несколько
+    воркеров не отправят один ответ дважды. Если воркер упал посреди
+    отправки, по истечении аренды строки снова становятся доступны.
+    """
+
+    def __init__(self, concurrency: int, batch_size: int, max_attempts: int, backoff: float, max_backoff: float):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+    async def enqueue(self, user_id: int, feedback_id, text: str) -> bool:
+        """Ставит ответ в очередь. False — ответ на этот отзыв уже в очереди или отправлен"""
+        return bool(await self.enqueue_many(user_id, {feedback_id: text}))
+
+    async def enqueue_many(self, user_id: int, replies: dict) -> list[str]:
+        """Ставит в очередь ответы {feedback_id: текст}, возвращает id действительно поставленных"""
+        now = time.time()
+        rows = [
+            {
+                "idempotency_key": idempotency_key(user_id, feedback_id),
+                "user_id": user_id,
+                "feedback_id": str(feedback_id),
+                "text": text,
+                "status": PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "last_error": None,
+                "created_at": now
+            }
+            for feedback_id, text in replies.items()
+        ]
+
+        queued = []
+        async with Session() as session:
+            # Частями, чтобы не упереться в лимит параметров запроса
+            for start in range(0, len(rows), Config.OUTBOX_BATCH_SIZE):
+                statement = insert(OutboxReply).values(rows[start:start + Config.OUTBOX_BATCH_SIZE])
+                # Ожидающий или отправленный ответ не трогаем, исчерпавший попытки — ставим заново.
+                # Вставка атомарна, поэтому параллельная постановка тех же отзывов не мешает остальным
+                statement = statement.on_conflict_do_update(
+                    index_elements=[OutboxReply.idempotency_key],
+                    set_={
+                        "text": statement.excluded.text,
+                        "status": PENDING,
+                        "attempts": 0,
+                        "next_attempt_at": statement.excluded.next_attempt_at,
+                        "last_error": None,
+                        "created_at": statement.excluded.created_at
+                    },
+                    where=OutboxReply.status == FAILED
+                ).returning(OutboxReply.feedback_id)
+                result = await session.execute(statement)
+                queued.extend(result.scalars())
+            await session.commit()
+
+        if queued:
+            self._wakeup.set()
+        return queued
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Reply outbox started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Даём дослать текущую пачку, чтобы не отправить ответ дважды после перезапуска
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, Config.OUTBOX_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Reply outbox stop timed out")
+        self._task = None
+        logger.info("Reply outbox stopped")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                delivered = await self._deliver_due()
+            except Exception as e:
+                logger.error(f"Reply outbox error: {e}")
+                delivered = 0
+
+            # Полная пачка — вероятно, есть ещё, забираем сразу
+            if delivered >= self.batch_size or self._stopping:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), Config.OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _deliver_due(self) -> int:
+        now = time.time()
+        # Ожидающие и зависшие в отправке: у 'sending' next_attempt_at — конец аренды
+        due = (OutboxReply.status.in_((PENDING, SENDING)), OutboxReply.next_attempt_at <= now)
+        async with Session() as session:
+            result = await session.execute(
+                select(OutboxReply.idempotency_key)
+                .where(*due)
+                .order_by(OutboxReply.next_attempt_at)
+                .limit(self.batch_size)
+            )
+            keys = list(result.scalars())
+            if not keys:
+                return 0
+
+            # Захватываем только строки, которые ещё никто не забрал: условие
+            # проверяется атомарно, и параллельный воркер получит их без нас
+            result = await session.execute(
+                update(OutboxReply)
+                .where(OutboxReply.idempotency_key.in_(keys), *due)
+                .values(status=SENDING, next_attempt_at=now + Config.OUTBOX_LEASE)
+                .returning(OutboxReply.idempotency_key)
+            )
+            claimed = list(result.scalars())
+            await session.commit()
+
+            if not claimed:
+                return 0
+            result = await session.execute(select(OutboxReply).where(OutboxReply.idempotency_key.in_(claimed)))
+            entries = result.scalars().all()
+
+        # Ответы одного продавца уходят одной массовой отправкой
+        by_user: dict[int, list[OutboxReply]] = {}
+        for entry in entries:
+            by_user.setdefault(entry.user_id, []).append(entry)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(user_id: int, user_entries: list[OutboxReply]):
+            async with semaphore:
+                await self._deliver(user_id, user_entries)
+
+        await asyncio.gather(*(deliver(user_id, user_entries) for user_id, user_entries in by_user.items()))
+        return len(entries)
+
+    async def _deliver(self, user_id: int, entries: list[OutboxReply]):
+        results, error, permanent = {}, "WB rejected the reply", False
+        try:
+            wb_api = await get_user_api(user_id)
+            if wb_api is None:
+                # Без ключа повторять бессмысленно
+                error, permanent = "WB API key is not configured", True
+            else:
+                results = await wb_api.send_replies({entry.feedback_id: entry.text for entry in entries})
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        now = time.time()
+        failed = []
+        for entry in entries:
+            entry.attempts += 1
+            if results.get(entry.feedback_id):
+                entry.status = SENT
+                entry.sent_at = now
+                entry.last_error = None
+            elif permanent or entry.attempts >= self.max_attempts:
+                entry.status = FAILED
+                entry.last_error = error
+                failed.append(entry)
+                logger.error(f"Reply to feedback {entry.feedback_id} failed after {entry.attempts} attempts: {error}")
+            else:
+                delay = min(self.backoff * 2 ** (entry.attempts - 1), self.max_backoff)
+                entry.status = PENDING
+                entry.next_attempt_at = now + delay + random.uniform(0, self.backoff)
+                entry.last_error = error
+                logger.warning(f"Reply to feedback {entry.feedback_id} failed ({error}), retry in {delay:.0f}s")
+
+        async with Session() as session:
+            for entry in entries:
+                await session.merge(entry)
+            await session.commit()
+
+        if failed:
+            # Ответ так и не ушёл — возвращаем отзывы в список неотвеченных
+            await review_store.mark_answered(user_id, [entry.feedback_id for entry in failed], answered=False)
+            self._notify_failed(user_id, failed)
+
+    def _notify_failed(self, user_id: int, entries: list[OutboxReply]):
+        if len(entries) == 1:
+            notifier.notify(user_id, f"❌ Не удалось отправить ответ на отзыв {entries[0].feedback_id}")
+        else:
+            notifier.notify(user_id, f"❌ Не удалось отправить ответы на отзывы: {len(entries)}")
+
+
+reply_outbox = ReplyOutbox(
+    concurrency=Config.OUTBOX_CONCURRENCY,
+    batch_size=Config.OUTBOX_BATCH_SIZE,
+    max_attempts=Config.OUTBOX_MAX_ATTEMPTS,
+    backoff=Config.OUTBOX_BACKOFF,
+    max_backoff=Config.OUTBOX_MAX_BACKOFF
+)
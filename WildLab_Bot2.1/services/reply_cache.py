@@ -0,0 +1,129 @@
+# services/reply_cache.py
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import Config
+from models import Session, ReplyCacheEntry, is_sqlite
+from services.generation import generation_service
+from utils.single_flight import SingleFlight
+import logging
+
+logger = logging.getLogger(__name__)
+
+insert = sqlite_insert if is_sqlite else pg_insert
+
+
+def prompt_key(namespace: int, prompt: str) -> str:
+    """Хэш нормализованного промпта в пространстве имён продавца"""
+    normalized = re.sub(r"\s+", " ", prompt).strip()
+    return hashlib.sha256(f"{namespace}\x00{normalized}".encode()).hexdigest()
+
+
+class ReplyCache:
+    """
+    Кэш сгенерированных ответов: LRU в памяти и, опционально, таблица в БД.
+
+    Устаревшие строки таблицы удаляются при записи, не чаще раза в purge_interval секунд.
+    """
+
+    def __init__(self, ttl: float, max_size: int, use_disk: bool, purge_interval: float):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_disk = use_disk
+        self.purge_interval = purge_interval
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._purged_at = 0.0
+
+    async def get(self, namespace: int, prompt: str) -> str | None:
+        key = prompt_key(namespace, prompt)
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._memory.move_to_end(key)
+                return entry[1]
+            del self._memory[key]
+
+        if not self.use_disk:
+            return None
+
+        async with Session() as session:
+            row = await session.get(ReplyCacheEntry, key)
+            if row is None:
+                return None
+            if row.created_at + self.ttl <= time.time():
+                await session.delete(row)
+                await session.commit()
+                return None
+
+        self._remember(key, row.reply, row.created_at + self.ttl)
+        return row.reply
+
+    async def put(self, namespace: int, prompt: str, reply: str):
+        key = prompt_key(namespace, prompt)
+        now = time.time()
+        self._remember(key, reply, now + self.ttl)
+
+        if not self.use_disk:
+            return
+
+        statement = insert(ReplyCacheEntry).values(key=key, namespace=namespace, reply=reply, created_at=now)
+        # Одинаковый промпт мог успеть записать параллельный запрос — просто перезаписываем
+        statement = statement.on_conflict_do_update(
+            index_elements=[ReplyCacheEntry.key],
+            set_={"reply": statement.excluded.reply, "created_at": statement.excluded.created_at}
+        )
+        async with Session() as session:
+            await session.execute(statement)
+            if now - self._purged_at >= self.purge_interval:
+                self._purged_at = now
+                result = await session.execute(
+                    delete(ReplyCacheEntry).where(ReplyCacheEntry.created_at < now - self.ttl)
+                )
+                if result.rowcount:
+                    logger.info(f"Reply cache purged {result.rowcount} expired entries")
+            await session.commit()
+
+    def _remember(self, key: str, reply: str, expires_at: float):
+        self._memory[key] = (expires_at, reply)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+
+reply_cache = ReplyCache(
+    ttl=Config.REPLY_CACHE_TTL,
+    max_size=Config.REPLY_CACHE_SIZE,
+    use_disk=Config.REPLY_CACHE_DISK,
+    purge_interval=Config.REPLY_CACHE_PURGE_INTERVAL
+)
+
+# Одинаковые промпты, запрошенные одновременно, генерируются один раз
+reply_flights = SingleFlight()
+
+
+async def generate_cached(prompt: str, namespace: int, key=None) -> str:
+    """Генерирует ответ через кэш; регенерация должна вызывать generation_service напрямую"""
+    # Ключ отмены входит в ключ полёта: иначе «Назад» в диалоге отменил бы и автоответ на тот же промпт
+    flight = (prompt_key(namespace, prompt), key)
+    return await reply_flights.do(flight, lambda: _generate_cached(prompt, namespace, key))
+
+
+async def _generate_cached(prompt: str, namespace: int, key) -> str:
+    try:
+        reply = await reply_cache.get(namespace, prompt)
+        if reply is not None:
+            return reply
+    except Exception as e:
+        logger.warning(f"Reply cache read failed: {e}")
+
+    reply = await generation_service.generate(prompt, key=key)
+
+    try:
+        await reply_cache.put(namespace, prompt, reply)
+    except Exception as e:
+        logger.warning(f"Reply cache write failed: {e}")
+    return reply
@@ -0,0 +1,200 @@
+# services/review_store.py
+import json
+import time
+from sqlalchemy import select, update, delete, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import Config
+from models import Session, Review, ReviewSync, OutboxReply, is_sqlite
+from utils.wb_api import get_user_api, feedback_timestamp
+import logging
+
+logger = logging.getLogger(__name__)
+
+insert = sqlite_insert if is_sqlite else pg_insert
+
+
+def _row(user_id: int, review: dict, seen_at: float) -> dict:
+    return {
+        "user_id": user_id,
+        "feedback_id": str(review["id"]),
+        "stars": review.get("stars"),
+        "cons": review.get("cons"),
+        "answered": False,
+        "notified": False,
+        "created_at": feedback_timestamp(review),
+        "seen_at": seen_at,
+        "data": json.dumps(review, ensure_ascii=False)
+    }
+
+
+def _pending_count(user_id: int):
+    return (
+        select(func.count())
+        .select_from(Review)
+        .where(Review.user_id == user_id, Review.answered.is_(False))
+    )
+
+
+async def _recount(session, user_id: int):
+    await session.execute(
+        update(ReviewSync).where(ReviewSync.user_id == user_id).values(pending=_pending_count(user_id).scalar_subquery())
+    )
+
+
+class ReviewStore:
+    """
+    Локальная копия неотвеченных отзывов продавцов.
+
+    Поллер дописывает новые отзывы и раз в REVIEW_STORE_RESYNC секунд
+    сверяет хранилище с WB целиком: отзывы, которых больше нет среди
+    неотвеченных, помечаются отвеченными. Ответы из бота помечаются сразу
+    (mark_answered) и не «воскресают» при выгрузке, пока их доставляет
+    outbox. Экраны бота читают отсюда индексированными запросами.
+    """
+
+    async def upsert(self, user_id: int, reviews: list, seen_at: float | None = None):
+        seen_at = seen_at or time.time()
+        rows = [_row(user_id, review, seen_at) for review in reviews if isinstance(review, dict) and review.get("id")]
+        if not rows:
+            return
+
+        statement = insert(Review)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Review.user_id, Review.feedback_id],
+            set_={
+                "stars": statement.excluded.stars,
+                "cons": statement.excluded.cons,
+                "seen_at": statement.excluded.seen_at,
+                "data": statement.excluded.data
+            }
+        )
+        async with Session() as session:
+            # executemany: SQLAlchemy сам собирает строки в пачки INSERT ... VALUES
+            await session.execute(statement, rows)
+            await _recount(session, user_id)
+            await session.commit()
+
+    async def sync(self, user_id: int, unanswered: list):
+        """Полная сверка: unanswered — все неотвеченные отзывы продавца из WB"""
+        now = time.time()
+        await self.upsert(user_id, unanswered, seen_at=now)
+
+        async with Session() as session:
+            # WB всё ещё считает отзыв неотвеченным (ответ удалил модератор или отзыв
+            # выпал из прошлой выгрузки при сдвиге страниц) — возвращаем его в список,
+            # если только ответ на него не ждёт отправки в outbox
+            in_outbox = select(OutboxReply.feedback_id).where(
+                OutboxReply.user_id == user_id, OutboxReply.status.in_(("pending", "sending"))
+            )
+            await session.execute(
+                update(Review)
+                .where(Review.user_id == user_id, Review.answered.is_(True), Review.seen_at >= now,
+                       Review.feedback_id.not_in(in_outbox))
+                .values(answered=False)
+            )
+            # Не пришедшие в этой выгрузке отвечены где-то ещё (например, в кабинете WB)
+            await session.execute(
+                update(Review)
+                .where(Review.user_id == user_id, Review.answered.is_(False), Review.seen_at < now)
+                .values(answered=True)
+            )
+            await session.execute(
+                delete(Review)
+                .where(Review.user_id == user_id, Review.answered.is_(True),
+                       Review.seen_at < now - Config.REVIEW_STORE_RETENTION)
+            )
+            await session.merge(ReviewSync(user_id=user_id, synced_at=now))
+            await session.flush()
+            await _recount(session, user_id)
+            await session.commit()
+        logger.info(f"Review store synced for user {user_id}: {len(unanswered)} unanswered")
+
+    async def ensure_synced(self, user_id: int):
+        """Первичная загрузка для продавца, которого поллер ещё не обошёл"""
+        async with Session() as session:
+            if await session.get(ReviewSync, user_id):
+                return
+
+        wb_api = await get_user_api(user_id)
+        if wb_api is not None:
+            await self.sync(user_id, await wb_api.get_unanswered_reviews())
+
+    async def mark_answered(self, user_id: int, feedback_ids: list, answered: bool = True):
+        if not feedback_ids:
+            return
+        async with Session() as session:
+            await session.execute(
+                update(Review)
+                .where(Review.user_id == user_id, Review.feedback_id.in_([str(id) for id in feedback_ids]))
+                .values(answered=answered)
+            )
+            await _recount(session, user_id)
+            await session.commit()
+
+    async def unanswered_ids(self, user_id: int, feedback_ids: list) -> set[str]:
+        """Какие из feedback_ids есть в хранилище и ещё не отвечены"""
+        ids = [str(id) for id in feedback_ids]
+        found = set()
+        async with Session() as session:
+            # Частями, чтобы не упереться в лимит параметров запроса
+            for start in range(0, len(ids), Config.REVIEW_STORE_CHUNK):
+                result = await session.execute(
+                    select(Review.feedback_id)
+                    .where(Review.user_id == user_id, Review.answered.is_(False),
+                           Review.feedback_id.in_(ids[start:start + Config.REVIEW_STORE_CHUNK]))
+                )
+                found.update(result.scalars())
+        return found
+
+    async def take_unnotified(self, user_id: int, feedback_ids: list) -> set[str]:
+        """Отмечает отзывы объявленными и возвращает те, о которых ещё не сообщали"""
+        ids = [str(id) for id in feedback_ids]
+        taken = set()
+        async with Session() as session:
+            for start in range(0, len(ids), Config.REVIEW_STORE_CHUNK):
+                result = await session.execute(
+                    update(Review)
+                    .where(Review.user_id == user_id, Review.notified.is_(False),
+                           Review.feedback_id.in_(ids[start:start + Config.REVIEW_STORE_CHUNK]))
+                    .values(notified=True)
+                    .returning(Review.feedback_id)
+                )
+                taken.update(result.scalars())
+            await session.commit()
+        return taken
+
+    async def get_page(self, user_id: int, page: int, page_size: int) -> tuple[list, int]:
+        """Страница неотвеченных отзывов (новые сверху) и их общее количество"""
+        async with Session() as session:
+            sync = await session.get(ReviewSync, user_id)
+            total = sync.pending if sync and sync.pending is not None else await session.scalar(_pending_count(user_id))
+            result = await session.execute(
+                select(Review.data)
+                .where(Review.user_id == user_id, Review.answered.is_(False))
+                .order_by(Review.created_at.desc())
+                .offset(page * page_size)
+                .limit(page_size)
+            )
+            return [json.loads(data) for data in result.scalars()], total
+
+    async def get(self, user_id: int, review_id) -> dict | None:
+        async with Session() as session:
+            data = await session.scalar(
+                select(Review.data).where(Review.user_id == user_id, Review.feedback_id == str(review_id))
+            )
+        return json.loads(data) if data else None
+
+    async def five_star_candidates(self, user_id: int) -> list:
+        """Неотвеченные на 5★ без недостатков — то же, что is_five_star_candidate"""
+        async with Session() as session:
+            result = await session.execute(
+                select(Review.data)
+                .where(Review.user_id == user_id, Review.answered.is_(False), Review.stars == 5,
+                       or_(Review.cons.is_(None), Review.cons.in_(("", "-"))))
+                .order_by(Review.created_at.desc())
+            )
+            return [json.loads(data) for data in result.scalars()]
+
+
+review_store = ReviewStore()
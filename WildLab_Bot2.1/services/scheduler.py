@@ -0,0 +1,89 @@
+# services/scheduler.py
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from aiogram import Bot
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from config import Config
+from models import Session, SchedulerRun
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveScheduler:
+    """
+    Периодически запускает фоновую задачу.
+
+    Проходы не пересекаются (max_instances=1, coalesce), время последнего
+    прохода хранится в БД, а пауза до следующего растёт вместе с длительностью
+    предыдущего, но не выходит за [POLL_MIN_INTERVAL, POLL_MAX_INTERVAL].
+    """
+
+    def __init__(self, name: str, job: Callable[[Bot], Awaitable[None]]):
+        self.name = name
+        self.job = job
+        self.scheduler = AsyncIOScheduler()
+
+    async def start(self, bot: Bot):
+        async with Session() as session:
+            run = await session.get(SchedulerRun, self.name)
+
+        # После перезапуска продолжаем по расписанию, а не запускаемся сразу
+        delay = 0.0
+        if run and run.last_finished_at:
+            elapsed = time.time() - run.last_finished_at
+            delay = max(self._next_delay(run.last_duration or 0.0) - elapsed, 0.0)
+
+        self.scheduler.start()
+        self._schedule(bot, delay)
+        logger.info(f"Scheduler '{self.name}' started, first run in {delay:.0f}s")
+
+    async def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+            logger.info(f"Scheduler '{self.name}' stopped")
+
+    def _next_delay(self, duration: float) -> float:
+        return min(max(duration * Config.POLL_IDLE_FACTOR, Config.POLL_MIN_INTERVAL), Config.POLL_MAX_INTERVAL)
+
+    def _schedule(self, bot: Bot, delay: float):
+        self.scheduler.add_job(
+            self._run,
+            'date',
+            run_date=datetime.now() + timedelta(seconds=delay),
+            args=(bot,),
+            id=self.name,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=None
+        )
+
+    async def _run(self, bot: Bot):
+        started_at = time.time()
+        try:
+            await self.job(bot)
+        except Exception as e:
+            logger.error(f"Scheduled job '{self.name}' failed: {e}")
+        finally:
+            finished_at = time.time()
+            duration = finished_at - started_at
+            try:
+                await self._save_run(started_at, finished_at, duration)
+            except Exception as e:
+                logger.error(f"Failed to persist run of '{self.name}': {e}")
+
+            delay = self._next_delay(duration)
+            logger.info(f"Job '{self.name}' took {duration:.1f}s, next run in {delay:.0f}s")
+            if self.scheduler.running:
+                self._schedule(bot, delay)
+
+    async def _save_run(self, started_at: float, finished_at: float, duration: float):
+        async with Session() as session:
+            run = await session.get(SchedulerRun, self.name) or SchedulerRun(job_name=self.name)
+            run.last_started_at = started_at
+            run.last_finished_at = finished_at
+            run.last_duration = duration
+            session.add(run)
+            await session.commit()
@@ -0,0 +1,80 @@
+# services/settings_cache.py
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from config import Config
+from models import Session, UserSettings
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """Неизменяемый снимок строки UserSettings"""
+    user_id: int
+    wb_api_key: str | None
+    notifications_enabled: bool
+    auto_reply_enabled: bool
+    auto_reply_five_stars: bool
+    greeting: str | None
+    farewell: str | None
+
+    @classmethod
+    def from_model(cls, user: UserSettings) -> "SettingsSnapshot":
+        return cls(
+            user_id=user.user_id,
+            wb_api_key=user.wb_api_key,
+            notifications_enabled=bool(user.notifications_enabled),
+            auto_reply_enabled=bool(user.auto_reply_enabled),
+            auto_reply_five_stars=bool(user.auto_reply_five_stars),
+            greeting=user.greeting,
+            farewell=user.farewell
+        )
+
+
+class SettingsCache:
+    """Read-through кэш настроек пользователей с записью при изменении"""
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        self.ttl = ttl
+        # Отсутствие пользователя помним недолго: он может появиться в любой момент
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        # user_id -> (момент устаревания, снимок или None, если пользователя нет)
+        self._entries: OrderedDict[int, tuple[float, SettingsSnapshot | None]] = OrderedDict()
+
+    async def get(self, user_id: int) -> SettingsSnapshot | None:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+        async with Session() as session:
+            user = await session.get(UserSettings, user_id)
+
+        snapshot = SettingsSnapshot.from_model(user) if user else None
+        self._store(user_id, snapshot)
+        return snapshot
+
+    def update(self, user: UserSettings):
+        """Вызывается после commit, чтобы кэш сразу видел новые значения"""
+        self._store(user.user_id, SettingsSnapshot.from_model(user))
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def _store(self, user_id: int, snapshot: SettingsSnapshot | None):
+        ttl = self.ttl if snapshot is not None else self.negative_ttl
+        self._entries[user_id] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# Кэш у каждого процесса свой: если с настройками работают несколько процессов,
+# изменения на одном доходят до остальных только по истечении TTL
+shared = Config.FSM_STORAGE == "redis" or Config.POLL_SHARDS > 1
+
+settings_cache = SettingsCache(
+    ttl=Config.SETTINGS_SHARED_TTL if shared else Config.SETTINGS_CACHE_TTL,
+    negative_ttl=Config.SETTINGS_NEGATIVE_TTL,
+    max_size=Config.SETTINGS_CACHE_SIZE
+)
@@ -0,0 +1,137 @@
+# services/sharding.py
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+from aiogram import Bot
+from sqlalchemy import select, update, or_
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from models import Session, ShardLease
+from services.scheduler import AdaptiveScheduler
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентное хэширование user_id по шардам (с виртуальными узлами)"""
+
+    def __init__(self, shards: int, vnodes: int = Config.SHARD_VNODES):
+        points = sorted((_hash(f"{shard}:{vnode}"), shard) for shard in range(shards) for vnode in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, user_id: int) -> int:
+        index = bisect.bisect(self._points, _hash(str(user_id))) % len(self._points)
+        return self._shards[index]
+
+
+class ShardedPoller:
+    """
+    Проверка отзывов одним процессом-шардом.
+
+    Каждый процесс владеет своим шардом через аренду в таблице poller_leases
+    и продлевает её раз в SHARD_HEARTBEAT секунд. Если аренда чужого шарда
+    истекла (процесс упал), её забирает любой живой процесс, а вернувшийся
+    владелец отбирает свой шард обратно. Проход проверяет только продавцов
+    из шардов, которыми процесс сейчас владеет.
+    """
+
+    def __init__(self, shard: int, shards: int, job: Callable[..., Awaitable[None]]):
+        self.shard = shard
+        self.shards = shards
+        self.job = job
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.ring = HashRing(shards)
+        self.owned: set[int] = set()
+        self.scheduler = AdaptiveScheduler(f"check_new_reviews:{shard}", self._poll)
+        self._heartbeat_task: asyncio.Task | None = None
+
+    def owns(self, user_id: int) -> bool:
+        return self.ring.shard_for(user_id) in self.owned
+
+    async def start(self, bot: Bot):
+        # При старте берём только свой шард, чтобы одновременно запущенные
+        # процессы не расхватали чужие до того, как владельцы поднимутся
+        await self._refresh_leases(adopt=False)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        await self.scheduler.start(bot)
+        logger.info(f"Poller shard {self.shard}/{self.shards} started as {self.owner}")
+
+    async def shutdown(self):
+        await self.scheduler.shutdown()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+
+        # Отпускаем аренды, чтобы другие процессы подхватили шарды сразу
+        async with Session() as session:
+            await session.execute(
+                update(ShardLease).where(ShardLease.owner == self.owner).values(expires_at=0.0)
+            )
+            await session.commit()
+        self.owned = set()
+        logger.info(f"Poller shard {self.shard} stopped")
+
+    async def _poll(self, bot: Bot):
+        if self.owned:
+            await self.job(bot, owns=self.owns)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(Config.SHARD_HEARTBEAT)
+            try:
+                await self._refresh_leases(adopt=True)
+            except Exception as e:
+                logger.error(f"Failed to refresh leases of shard {self.shard}: {e}")
+
+    async def _ensure_leases(self):
+        async with Session() as session:
+            result = await session.execute(select(ShardLease.shard))
+            existing = set(result.scalars())
+            missing = [shard for shard in range(self.shards) if shard not in existing]
+            if not missing:
+                return
+            session.add_all(ShardLease(shard=shard, expires_at=0.0, adopted=False) for shard in missing)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Строки успел создать другой процесс
+                pass
+
+    async def _refresh_leases(self, adopt: bool):
+        await self._ensure_leases()
+
+        now = time.time()
+        owned = set()
+        async with Session() as session:
+            for shard in range(self.shards):
+                if shard == self.shard:
+                    # Свой шард забираем и у процесса, подхватившего его после падения
+                    condition = or_(ShardLease.owner == self.owner, ShardLease.expires_at < now,
+                                    ShardLease.adopted.is_(True))
+                elif adopt:
+                    condition = or_(ShardLease.owner == self.owner, ShardLease.expires_at < now)
+                else:
+                    continue
+
+                result = await session.execute(
+                    update(ShardLease)
+                    .where(ShardLease.shard == shard, condition)
+                    .values(owner=self.owner, expires_at=now + Config.SHARD_LEASE_TTL, adopted=shard != self.shard)
+                )
+                if result.rowcount:
+                    owned.add(shard)
+            await session.commit()
+
+        if owned != self.owned:
+            logger.info(f"Poller {self.owner} now owns shards {sorted(owned)}")
+        self.owned = owned
@@ -1,13 +1,46 @@
+import time
+from collections import OrderedDict
 from aiogram import Bot
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def check_subscription(bot: Bot, user_id: int) -> bool:
+SUBSCRIBED_STATUSES = {"member", "administrator", "creator"}
+
+# user_id -> (момент устаревания, подписан ли); LRU — давно не заходившие вытесняются первыми
+_subscription_cache: OrderedDict[int, tuple[float, bool]] = OrderedDict()
+
+
+def set_subscription_status(user_id: int, subscribed: bool):
+    ttl = Config.SUBSCRIPTION_POSITIVE_TTL if subscribed else Config.SUBSCRIPTION_NEGATIVE_TTL
+    _subscription_cache[user_id] = (time.monotonic() + ttl, subscribed)
+    _subscription_cache.move_to_end(user_id)
+    while len(_subscription_cache) > Config.SUBSCRIPTION_CACHE_SIZE:
+        _subscription_cache.popitem(last=False)
+
+
+def is_channel(chat) -> bool:
+    """Совпадает ли чат с Config.CHANNEL_ID (он задан как @username или числовой id)"""
+    if Config.CHANNEL_ID.startswith("@"):
+        return (chat.username or "").lower() == Config.CHANNEL_ID[1:].lower()
+    return str(chat.id) == Config.CHANNEL_ID
+
+
+async def check_subscription(bot: Bot, user_id: int, force: bool = False) -> bool:
+    if not force:
+        cached = _subscription_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            _subscription_cache.move_to_end(user_id)
+            return cached[1]
+
     try:
         member = await bot.get_chat_member(Config.CHANNEL_ID, user_id)
-        return member.status in {"member", "administrator", "creator"}
+        subscribed = member.status in SUBSCRIBED_STATUSES
     except Exception as e:
+        # Ошибку не кэшируем, чтобы следующий клик проверил заново
         logger.error(f"Subscription check error: {e}")
-        return False
\ No newline at end of file
+        return False
+
+    set_subscription_status(user_id, subscribed)
+    return subscribed
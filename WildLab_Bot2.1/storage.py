@@ -1,4 +1,118 @@
 # storage.py
-from collections import defaultdict
+import asyncio
+import json
+import time
+from typing import Any, Mapping
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, BaseEventIsolation, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+from config import Config
+import logging
 
-temp_storage = defaultdict(dict)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """Встроенное FSM-хранилище в SQLite; брошенные сценарии удаляются по TTL"""
+
+    def __init__(self, path: str, ttl: int | None = None):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        self._db: aiosqlite.Connection | None = None
+        self._lock = asyncio.Lock()
+        self._purged_at = 0.0
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute(
+                        "CREATE TABLE IF NOT EXISTS fsm ("
+                        "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', "
+                        "updated_at REAL NOT NULL)"
+                    )
+                    await db.execute("CREATE INDEX IF NOT EXISTS ix_fsm_updated_at ON fsm (updated_at)")
+                    await db.commit()
+                    self._db = db
+        return self._db
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    async def _purge(self, db: aiosqlite.Connection):
+        # Чистим просроченные записи не чаще раза в минуту
+        if not self.ttl or time.monotonic() - self._purged_at < 60:
+            return
+        self._purged_at = time.monotonic()
+        await db.execute("DELETE FROM fsm WHERE updated_at < ?", (self._expired_before(),))
+
+    async def _get_row(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        db = await self._connection()
+        async with db.execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?",
+            (self.key_builder.build(key), self._expired_before())
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        db = await self._connection()
+        await db.execute(
+            "INSERT INTO fsm (key, state, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (self.key_builder.build(key), state, time.time())
+        )
+        await self._purge(db)
+        await db.commit()
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._get_row(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        db = await self._connection()
+        await db.execute(
+            "INSERT INTO fsm (key, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (self.key_builder.build(key), json.dumps(dict(data), ensure_ascii=False), time.time())
+        )
+        await self._purge(db)
+        await db.commit()
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._get_row(key)
+        return data
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+def build_fsm_storage() -> tuple[BaseStorage, BaseEventIsolation]:
+    """Создаёт FSM-хранилище и изоляцию событий согласно Config.FSM_STORAGE"""
+    if Config.FSM_STORAGE == "redis":
+        # redis нужен только для этого режима
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        storage = RedisStorage.from_url(
+            Config.REDIS_URL,
+            state_ttl=Config.FSM_TTL,
+            data_ttl=Config.FSM_TTL
+        )
+        # Блокировки в Redis упорядочивают события одного чата между воркерами
+        return storage, storage.create_isolation()
+
+    if Config.FSM_STORAGE == "sqlite":
+        return SQLiteStorage(Config.FSM_SQLITE_PATH, ttl=Config.FSM_TTL), SimpleEventIsolation()
+
+    if Config.FSM_STORAGE != "memory":
+        logger.warning(f"Unknown FSM storage '{Config.FSM_STORAGE}', falling back to memory")
+    return MemoryStorage(), SimpleEventIsolation()
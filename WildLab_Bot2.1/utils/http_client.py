@@ -0,0 +1,43 @@
+# utils/http_client.py
+import asyncio
+import aiohttp
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """Общий для процесса пул соединений aiohttp"""
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+        self._lock = asyncio.Lock()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая её при первом обращении"""
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=Config.HTTP_POOL_LIMIT,
+                        limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,
+                        ttl_dns_cache=Config.HTTP_DNS_CACHE_TTL,
+                        keepalive_timeout=Config.HTTP_KEEPALIVE_TIMEOUT
+                    )
+                    self._session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=aiohttp.ClientTimeout(total=Config.HTTP_TIMEOUT)
+                    )
+                    logger.info("HTTP connection pool created")
+        return self._session
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP connection pool closed")
+        self._session = None
+
+
+http_client = HttpClient()
@@ -1,76 +1,86 @@
+from typing import Awaitable, Callable
+from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+# Источник отзывов: (page, page_size) -> (отзывы страницы, общее количество)
+ReviewSource = Callable[[int, int], Awaitable[tuple[list, int]]]
 
-def paginate_reviews(reviews: list, page: int, page_size: int = 5) -> dict:
+
+def review_button_text(review: dict) -> str:
+    stars = review.get("stars", 0)
+    comment = review.get("comment") or ""
+    has_photo = review.get("photo", False)
+    return f"{stars}⭐ | {'📸' if has_photo else ''} {comment[:20]}..."
+
+
+async def paginate_reviews(source: ReviewSource, page: int, page_size: int = 5,
+                           back_callback: str | None = None,
+                           actions: list[InlineKeyboardButton] | None = None) -> dict:
     """
-    Пагинация списка отзывов.
+    Пагинация отзывов.
 
     Args:
-        reviews (list): Список отзывов.
+        source (ReviewSource): Источник, загружающий только запрошенную страницу.
         page (int): Текущая страница.
         page_size (int): Количество отзывов на странице.
+        back_callback (str | None): callback_data кнопки «Назад» под пагинацией.
+        actions (list[InlineKeyboardButton] | None): Кнопки действий над всем списком.
 
     Returns:
-        dict: Словарь с отзывами и клавиатурой пагинации.
+        dict: Отзывы страницы, итоговая клавиатура, номер страницы и число страниц.
     """
     # Проверка входных данных
-    if not isinstance(reviews, list):
-        raise ValueError("reviews должен быть списком")
-
     if not isinstance(page, int) or page < 0:
         raise ValueError("page должен быть неотрицательным целым числом")
 
     if not isinstance(page_size, int) or page_size <= 0:
         raise ValueError("page_size должен быть положительным целым числом")
 
+    reviews, total = await source(page, page_size)
+
+    # Страница могла исчезнуть (на отзывы ответили) — переходим на последнюю
+    if not reviews and total:
+        page = (total - 1) // page_size
+        reviews, total = await source(page, page_size)
+
     # Если список отзывов пуст, возвращаем пустой результат
     if not reviews:
         return {
             "reviews": [],
-            "keyboard": None
+            "keyboard": None,
+            "page": 0,
+            "pages": 0
         }
 
-    # Вычисляем общее количество страниц
-    total = len(reviews)
-    pages = (total + page_size - 1) // page_size
-
-    # Корректируем текущую страницу, если она выходит за пределы
-    if page >= pages:
-        page = pages - 1
-
-    # Вычисляем индексы для среза
-    start_idx = page * page_size
-    end_idx = start_idx + page_size
-
-    # Создаем клавиатуру для отзывов
-    reviews_builder = InlineKeyboardBuilder()
-    for review in reviews[start_idx:end_idx]:
-        # Проверяем, что review — это словарь и содержит необходимые поля
-        if not isinstance(review, dict):
-            continue
-
-        review_id = review.get("id")
-        stars = review.get("stars", 0)
-        comment = review.get("comment", "")
-        has_photo = review.get("photo", False)
-
-        # Формируем текст кнопки
-        review_text = f"{stars}⭐ | {'📸' if has_photo else ''} {comment[:20]}..."
-        reviews_builder.button(
-            text=review_text,
-            callback_data=f"review_{review_id}"
-        )
-
-    # Создаем клавиатуру для пагинации
-    pagination_builder = InlineKeyboardBuilder()
+    pages = max((total + page_size - 1) // page_size, 1)
+    page = min(page, pages - 1)
+
+    # Отзывы, пагинация и «Назад» собираются в одну клавиатуру за один проход
+    builder = InlineKeyboardBuilder()
+    reviews = [review for review in reviews if isinstance(review, dict)]
+    for review in reviews:
+        builder.row(InlineKeyboardButton(
+            text=review_button_text(review),
+            callback_data=f"review_{review.get('id')}"
+        ))
+
+    navigation = []
     if page > 0:
-        pagination_builder.button(text="◀️", callback_data=f"page_{page - 1}")
-    pagination_builder.button(text=f"{page + 1}/{pages}", callback_data="current")
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"page_{page - 1}"))
+    navigation.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="current"))
     if page < pages - 1:
-        pagination_builder.button(text="▶️", callback_data=f"page_{page + 1}")
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"page_{page + 1}"))
+    builder.row(*navigation)
+
+    for action in actions or ():
+        builder.row(action)
+
+    if back_callback:
+        builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data=back_callback))
 
-    # Возвращаем результат
     return {
-        "reviews": reviews[start_idx:end_idx],
-        "keyboard": pagination_builder.as_markup()
-    }
\ No newline at end of file
+        "reviews": reviews,
+        "keyboard": builder.as_markup(),
+        "page": page,
+        "pages": pages
+    }
@@ -1,21 +1,52 @@
 # utils/prompts.py
+from dataclasses import dataclass
+from functools import lru_cache
+from config import Config
 from models import UserSettings
+
+PROMPT_VERSION = "v1.0"
+PROMPT_HEADER = "Напиши ответ на отзыв с содержанием:"
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Скомпилированный шаблон продавца: статичные части собраны один раз"""
+    signature: str
+    footer: str
+
+    def render(self, review: dict, arguments: list, solution: str = None) -> str:
+        sections = [
+            PROMPT_HEADER,
+            f"Отзыв: {review['comment']}",
+            f"Достоинства: {review.get('pros', 'не указаны')}",
+            f"Недостатки: {review.get('cons', 'не указаны')}"
+        ]
+
+        if self.signature:
+            sections.append(self.signature)
+        if arguments:
+            sections.append(f"Используй аргументы: {', '.join(arguments)}")
+        if solution:
+            sections.append(f"Предложи решение: {solution}")
+
+        sections.append(self.footer)
+        return "\n".join(sections)
+
+
+@lru_cache(maxsize=Config.PROMPT_TEMPLATE_CACHE_SIZE)
+def compile_template(greeting: str | None, farewell: str | None) -> PromptTemplate:
+    """Шаблон кэшируется по подписи, поэтому её изменение даёт новый шаблон"""
+    signature = []
+    if greeting:
+        signature.append(f"Используй приветствие: {greeting}")
+    if farewell:
+        signature.append(f"Используй прощание: {farewell}")
+
+    return PromptTemplate(
+        signature="\n".join(signature),
+        footer=f"\n<!-- TEST PROMPT {PROMPT_VERSION} -->"
+    )
+
+
 def build_prompt(review: dict, user: UserSettings, arguments: list, solution: str = None) -> str:
-    sections = [
-        "Напиши ответ на отзыв с содержанием:",
-        f"Отзыв: {review['comment']}",
-        f"Достоинства: {review.get('pros', 'не указаны')}",
-        f"Недостатки: {review.get('cons', 'не указаны')}"
-    ]
-
-    if user.greeting:
-        sections.append(f"Используй приветствие: {user.greeting}")
-    if user.farewell:
-        sections.append(f"Используй прощание: {user.farewell}")
-    if arguments:
-        sections.append(f"Используй аргументы: {', '.join(arguments)}")
-    if solution:
-        sections.append(f"Предложи решение: {solution}")
-
-    sections.append("\n<!-- TEST PROMPT v1.0 -->")
-    return "\n".join(sections)
\ No newline at end of file
+    return compile_template(user.greeting, user.farewell).render(review, arguments, solution)
@@ -0,0 +1,57 @@
+# utils/rate_limit.py
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1):
+        # Ожидающие обслуживаются по очереди, чтобы не было гонки за токенами
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+    def is_idle(self) -> bool:
+        """Ведро полное и никто не ждёт — его можно удалить без потери состояния"""
+        self._refill()
+        return self._tokens >= self.capacity and not self._lock.locked()
+
+
+class KeyedRateLimiter:
+    """Отдельный token bucket на каждый ключ (API-ключ, чат и т.п.)"""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int | None = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, key: str, tokens: float = 1):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if self.max_keys and len(self._buckets) >= self.max_keys:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+        await bucket.acquire(tokens)
+
+    def _prune(self):
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_idle()]:
+            del self._buckets[key]
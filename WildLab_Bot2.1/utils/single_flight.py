@@ -0,0 +1,29 @@
+# utils/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых запросов, выполняющихся одновременно.
+
+    Пока запрос с ключом key в полёте, остальные вызовы с тем же ключом
+    не создают новый, а ждут его и получают тот же результат (или ту же
+    ошибку). Отмена одного ожидающего не отменяет общий запрос.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.create_task(func())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        self._calls.pop(key, None)
+        # Если все ожидающие отменились, ошибку никто не заберёт — забираем сами
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,51 @@
+# utils/telegram_throttle.py
+import asyncio
+import time
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from utils.rate_limit import TokenBucket, KeyedRateLimiter
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramThrottle(BaseRequestMiddleware):
+    """
+    Ограничение исходящих запросов к Bot API.
+
+    Запросы в чат (всё, что содержит chat_id) проходят через два token
+    bucket: общий на бота и отдельный на чат. Если Telegram всё же ответил
+    429, все запросы бота ждут retry_after и неудачный повторяется.
+    """
+
+    def __init__(self, global_rate: float, global_burst: int, chat_rate: float, chat_burst: int,
+                 retries: int, max_chats: int):
+        self.retries = retries
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = KeyedRateLimiter(chat_rate, chat_burst, max_keys=max_chats)
+        self._paused_until = 0.0
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in range(self.retries + 1):
+            await self._wait_pause()
+            if chat_id is not None:
+                await self._chats.acquire(str(chat_id))
+                await self._global.acquire()
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Flood control on {type(method).__name__}, pausing for {e.retry_after}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+
+    async def _wait_pause(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -1,65 +1,153 @@
 # utils/wb_api.py
-import aiohttp
-from models import UserSettings, Session
+from services.settings_cache import settings_cache
 from config import Config
+from utils.http_client import http_client
+from utils.rate_limit import KeyedRateLimiter
+from utils.single_flight import SingleFlight
+from datetime import datetime
+import asyncio
+from typing import AsyncIterator
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Квоты WB считаются по API-ключу, поэтому и ограничение — на ключ
+wb_rate_limiter = KeyedRateLimiter(rate=Config.WB_RATE_LIMIT, capacity=Config.WB_RATE_BURST)
+
+
+def share_wb_quota(processes: int):
+    """Квота WB на ключ общая для процессов, которые им пользуются: каждому своя доля"""
+    wb_rate_limiter.rate = Config.WB_RATE_LIMIT / processes
+    wb_rate_limiter.capacity = max(1, Config.WB_RATE_BURST // processes)
+
+
+# Повторные нажатия и поллер не должны качать одни и те же отзывы параллельно
+wb_requests = SingleFlight()
+
+
+class WBAPIError(Exception):
+    pass
+
 
 class WildberriesAPI:
     def __init__(self, api_key: str):
+        self.api_key = api_key
         self.base_url = "https://feedbacks-api.wildberries.ru/api/v1"
         self.headers = {
             "Authorization": api_key,
             "Content-Type": "application/json"
         }
 
-    async def get_unanswered_reviews(self) -> list:
-        """Получает непросмотренные отзывы"""
+    async def get_reviews_page(self, skip: int, take: int, date_from: int | None = None,
+                               order: str | None = None) -> tuple[list, int]:
+        """Получает одну страницу неотвеченных отзывов и их общее количество"""
+        key = (self.api_key, "page", skip, take, date_from, order)
+        return await wb_requests.do(key, lambda: self._fetch_reviews_page(skip, take, date_from, order))
+
+    async def _fetch_reviews_page(self, skip: int, take: int, date_from: int | None,
+                                  order: str | None) -> tuple[list, int]:
         url = f"{self.base_url}/feedbacks"
         params = {
-            "isAnswered": False,
-            "take": 5000,
-            "skip": 0
+            "isAnswered": "false",
+            "take": take,
+            "skip": skip
         }
+        if date_from is not None:
+            params["dateFrom"] = date_from
+        if order:
+            params["order"] = order
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("data", {}).get("feedbacks", [])
-                logger.error(f"WB API Error: {await response.text()}")
-                return []
+        await wb_rate_limiter.acquire(self.api_key)
+        session = await http_client.get_session()
+        async with session.get(url, headers=self.headers, params=params) as response:
+            if response.status == 200:
+                data = (await response.json()).get("data") or {}
+                return data.get("feedbacks") or [], data.get("countUnanswered", 0)
+            # Пустой список здесь выглядел бы как «всё отвечено» — это сломало бы сверку
+            raise WBAPIError(f"WB API Error {response.status}: {await response.text()}")
+
+    async def iter_unanswered_reviews(self, page_size: int = Config.WB_PAGE_SIZE, date_from: int | None = None,
+                                      order: str | None = None) -> AsyncIterator[dict]:
+        """Постранично обходит неотвеченные отзывы, отдавая их по мере загрузки"""
+        skip = 0
+        while True:
+            feedbacks, _ = await self.get_reviews_page(skip, page_size, date_from=date_from, order=order)
+            for feedback in feedbacks:
+                yield feedback
+
+            if len(feedbacks) < page_size:
+                return
+            skip += page_size
+
+    async def get_unanswered_reviews(self) -> list:
+        """Получает все неотвеченные отзывы"""
+        return await wb_requests.do((self.api_key, "unanswered"), self._fetch_unanswered_reviews)
+
+    async def _fetch_unanswered_reviews(self) -> list:
+        return [review async for review in self.iter_unanswered_reviews()]
+
+    async def get_new_reviews(self, since: float | None, seen_ids: set[str] | None = None) -> list:
+        """
+        Дельта-режим: возвращает только отзывы новее водяного знака.
+
+        Отзывы идут от новых к старым, поэтому обход прекращается на первом
+        отзыве старше since. Отзывы ровно с временем since отбрасываются, если
+        они уже есть в seen_ids. Без водяного знака возвращаются все неотвеченные.
+        """
+        date_from = int(since) if since is not None else None
+        new_reviews = []
+        async for review in self.iter_unanswered_reviews(date_from=date_from, order="dateDesc"):
+            if since is not None:
+                created_at = feedback_timestamp(review)
+                if created_at < since:
+                    break
+                if created_at == since and str(review.get("id")) in (seen_ids or ()):
+                    continue
+            new_reviews.append(review)
+        return new_reviews
 
     async def send_reply(self, feedback_id: str, text: str) -> bool:
         """Отправляет ответ на отзыв"""
         url = f"{self.base_url}/feedbacks/{feedback_id}/answer"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json={"text": text}) as response:
-                return response.status == 200
+        await wb_rate_limiter.acquire(self.api_key)
+        session = await http_client.get_session()
+        async with session.post(url, headers=self.headers, json={"text": text}) as response:
+            return response.status == 200
+
+    async def send_replies(self, replies: dict, concurrency: int = Config.WB_BULK_CONCURRENCY) -> dict:
+        """
+        Массовая отправка ответов: {feedback_id: текст} -> {feedback_id: успех}.
+
+        Запросы идут через общий пул соединений, не больше concurrency
+        одновременно; ошибка одного ответа не прерывает остальные.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
 
+        async def send(feedback_id, text: str) -> bool:
+            async with semaphore:
+                try:
+                    return await self.send_reply(feedback_id, text)
+                except Exception as e:
+                    logger.warning(f"WB send error for feedback {feedback_id}: {e}")
+                    return False
 
-async def get_unanswered_reviews(user_id: int) -> list:
-    with Session() as session:
-        user = session.get(UserSettings, user_id)
-        if not user or not user.wb_api_key:
-            logger.warning(f"User {user_id} has no WB API key configured")
-            return []
+        results = await asyncio.gather(*(send(feedback_id, text) for feedback_id, text in replies.items()))
+        return dict(zip(replies, results))
 
-        wb_api = WildberriesAPI(user.wb_api_key)
-        try:
-            reviews = await wb_api.get_unanswered_reviews()
 
-            # Логируем ответ от API
-            logger.debug(f"API Response: {reviews}")
+def feedback_timestamp(review: dict) -> float:
+    """Время создания отзыва (createdDate) в секундах Unix"""
+    created = review.get("createdDate")
+    if not created:
+        return 0.0
+    return datetime.fromisoformat(created.replace("Z", "+00:00")).timestamp()
 
-            if not isinstance(reviews, list):
-                logger.error(f"Invalid reviews format: {type(reviews)}")
-                return []
 
-            return reviews
-        except Exception as e:
-            logger.error(f"WB API error: {e}")
-            return []
\ No newline at end of file
+async def get_user_api(user_id: int) -> WildberriesAPI | None:
+    """Возвращает клиент WB для пользователя или None, если ключ не настроен"""
+    user = await settings_cache.get(user_id)
+    if not user or not user.wb_api_key:
+        logger.warning(f"User {user_id} has no WB API key configured")
+        return None
+    return WildberriesAPI(user.wb_api_key)
@@ -0,0 +1,118 @@
+# webhook.py
+import asyncio
+import secrets
+import signal
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from config import Config
+from dispatch import UpdateDispatcher
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём обновлений через webhook на aiohttp.
+
+    Запрос проверяется по секретному токену и сразу получает ответ 200,
+    а обновление передаётся в UpdateDispatcher. При остановке новые
+    запросы отклоняются, а принятые обновления дорабатываются.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, concurrency: int, max_pending: int, secret: str):
+        if not secret:
+            raise ValueError("Webhook secret token is required")
+        self.bot = bot
+        self.dp = dp
+        self.secret = secret
+        self.updates = UpdateDispatcher(bot, dp, concurrency=concurrency, max_pending=max_pending)
+        self._draining = False
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(Config.WEBHOOK_PATH, self.handle)
+        app.on_startup.append(self.on_startup)
+        app.on_shutdown.append(self.on_shutdown)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        if self._draining:
+            # Telegram повторит доставку позже, возможно на другой воркер
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            # Битый JSON или не Update — это ошибка клиента, а не сервера
+            return web.Response(status=400)
+        # Если очереди заполнены, ответ задерживается — Telegram сбавит темп
+        await self.updates.submit(update)
+        return web.Response()
+
+    async def on_startup(self, app: web.Application):
+        await self.dp.emit_startup(bot=self.bot, dispatcher=self.dp, app=app, **self.dp.workflow_data)
+
+        if Config.WEBHOOK_URL:
+            await self.bot.set_webhook(
+                url=f"{Config.WEBHOOK_URL}{Config.WEBHOOK_PATH}",
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+        logger.info("Webhook server started")
+
+    async def on_shutdown(self, app: web.Application):
+        self._draining = True
+        await self.updates.close(Config.UPDATE_DRAIN_TIMEOUT)
+
+        await self.dp.emit_shutdown(bot=self.bot, dispatcher=self.dp, app=app, **self.dp.workflow_data)
+        await self.bot.session.close()
+        logger.info("Webhook server stopped")
+
+
+def resolve_secret() -> str:
+    """
+    Секрет для заголовка X-Telegram-Bot-Api-Secret-Token.
+
+    Без секрета webhook принимал бы поддельные обновления от кого угодно.
+    Если бот сам регистрирует webhook (задан WEBHOOK_URL), секрет можно
+    сгенерировать, иначе он обязан быть задан в BOT_WEBHOOK_SECRET.
+    Несколько воркеров за одним URL должны использовать общий заданный секрет.
+    """
+    if Config.WEBHOOK_SECRET:
+        return Config.WEBHOOK_SECRET
+    if Config.WEBHOOK_URL:
+        logger.info("BOT_WEBHOOK_SECRET is not set, generated a random secret token")
+        return secrets.token_urlsafe(32)
+    raise RuntimeError("Webhook mode requires BOT_WEBHOOK_SECRET (or BOT_WEBHOOK_URL to generate one)")
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    server = WebhookServer(
+        bot,
+        dp,
+        concurrency=Config.UPDATE_CONCURRENCY,
+        max_pending=Config.UPDATE_MAX_PENDING,
+        secret=resolve_secret()
+    )
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, Config.WEBAPP_HOST, Config.WEBAPP_PORT)
+    await site.start()
+    logger.info(f"Listening on {Config.WEBAPP_HOST}:{Config.WEBAPP_PORT}{Config.WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        # cleanup вызывает on_shutdown, где очередь дорабатывается
+        await runner.cleanup()
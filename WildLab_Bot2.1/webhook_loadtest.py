@@ -0,0 +1,135 @@
+# webhook_loadtest.py
+"""
+Нагрузочный тест webhook-режима без Telegram.
+
+Поднимает заглушку Bot API и webhook-сервер с настоящими роутерами,
+отправляет синтетические /start от множества чатов и печатает пропускную
+способность. Пример: python webhook_loadtest.py --updates 5000 --chats 500
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import tempfile
+import time
+
+# Тест не должен трогать рабочие данные: своя временная БД и FSM в памяти.
+# Иначе запущенный с диспетчером outbox разослал бы в WB ожидающие ответы продавцов
+WORKDIR = tempfile.mkdtemp(prefix="wildlab-loadtest-")
+os.environ["BOT_DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'bot.db')}"
+os.environ["BOT_FSM_STORAGE"] = "memory"
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from config import Config
+from models import init_db
+from webhook import WebhookServer, SECRET_HEADER
+
+STUB_PORT = 8081
+
+
+def create_stub_api() -> tuple[web.Application, dict]:
+    """Отвечает на любой метод Bot API правдоподобным успешным результатом"""
+    stats = {"calls": 0}
+    message_ids = itertools.count(1)
+
+    async def handle(request: web.Request) -> web.Response:
+        stats["calls"] += 1
+        method = request.match_info["method"].lower()
+        params = dict(await request.post()) if request.can_read_body else {}
+
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub"}
+        elif method.startswith(("send", "edit")):
+            result = {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", "")
+            }
+        elif method == "getchatmember":
+            result = {"status": "member", "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "U"}}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    return app, stats
+
+
+def make_update(update_id: int, chat_id: int) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": "Load"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+        }
+    }
+
+
+async def run(updates: int, chats: int, concurrency: int):
+    from main import create_dispatcher
+
+    await init_db()
+
+    stub_app, stats = create_stub_api()
+    stub_runner = web.AppRunner(stub_app)
+    await stub_runner.setup()
+    await web.TCPSite(stub_runner, "127.0.0.1", STUB_PORT).start()
+
+    bot = Bot(
+        token=Config.API_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{STUB_PORT}"))
+    )
+    secret = "loadtest"
+    server = WebhookServer(bot, create_dispatcher(with_poller=False), concurrency=Config.UPDATE_CONCURRENCY,
+                           max_pending=Config.UPDATE_MAX_PENDING, secret=secret)
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", Config.WEBAPP_PORT).start()
+
+    url = f"http://127.0.0.1:{Config.WEBAPP_PORT}{Config.WEBHOOK_PATH}"
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict[int, int] = {}
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update_id: int):
+            async with semaphore:
+                async with session.post(url, json=make_update(update_id, 1000 + update_id % chats),
+                                        headers={SECRET_HEADER: secret}) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(1, updates + 1)))
+        accepted = time.perf_counter() - started
+
+        # on_shutdown дорабатывает очередь — это и есть время полной обработки
+        await runner.cleanup()
+        processed = time.perf_counter() - started
+
+    await stub_runner.cleanup()
+    print(f"HTTP statuses: {statuses}")
+    print(f"Accepted {updates} updates in {accepted:.2f}s ({updates / accepted:.0f}/s)")
+    print(f"Processed in {processed:.2f}s ({updates / processed:.0f}/s), Bot API calls: {stats['calls']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.updates, args.chats, args.concurrency))
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)